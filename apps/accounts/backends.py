@@ -0,0 +1,89 @@
+import time
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Columns kept in the cached snapshot: what the role mixins and the page header
+# need. Anything else is loaded lazily on access. The password hash isn't kept,
+# only the session auth hash derived from it (see User.get_session_auth_hash).
+SNAPSHOT_FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'role',
+    'is_active', 'is_staff', 'is_superuser',
+)
+SNAPSHOT_TIMEOUT = 60 * 15
+
+
+def _version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+def user_version(user_id):
+    """Changes whenever the user row does; also part of page ETags."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version evicted from the cache can't come back with an old value
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def user_versions(user_ids):
+    """user_version() of each of `user_ids`, in order, from one cache round trip."""
+    keys = [_version_key(user_id) for user_id in user_ids]
+    found = cache.get_many(keys)
+    return [found[key] if key in found else user_version(user_id) for user_id, key in zip(user_ids, keys)]
+
+
+def invalidate_user_snapshot(user_id):
+    """Move the user to a new version so any cached snapshot is ignored."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def invalidate_user_snapshots(user_ids):
+    """Invalidate many users at once, e.g. after a bulk write that sent no signals."""
+    # A missing version is reseeded from the clock, which is newer than any cached one
+    cache.delete_many([_version_key(user_id) for user_id in user_ids])
+
+
+def get_user_snapshot(user_id):
+    """
+    Return a User for `user_id` built from the cache, or None if there is none.
+
+    Only SNAPSHOT_FIELDS are loaded; other fields are deferred, so touching them
+    falls back to the database as usual.
+    """
+    User = get_user_model()
+    # from_db() expects values in model field order
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in SNAPSHOT_FIELDS]
+    key = f'auth:snapshot:{user_id}:{user_version(user_id)}'
+    cached = cache.get(key)
+    if cached is None:
+        row = User._default_manager.filter(pk=user_id).values_list(*field_names, 'password').first()
+        if row is None:
+            return None
+        *values, password = row
+        cached = (values, User(password=password).get_session_auth_hash())
+        cache.set(key, cached, SNAPSHOT_TIMEOUT)
+    values, session_auth_hash = cached
+    user = User.from_db(DEFAULT_DB_ALIAS, field_names, values)
+    user.snapshot_session_auth_hash = session_auth_hash
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that resolves the logged-in user from a cached snapshot.
+
+    django.contrib.auth still verifies the session hash against the snapshot's
+    session auth hash, and saving or deleting a user bumps its version (see
+    accounts.signals), so role or password changes take effect immediately.
+    """
+
+    def get_user(self, user_id):
+        user = get_user_snapshot(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    User snapshots (see backends) are invalidated in the process that saved the
+    user. With a per-process cache every other worker would keep authenticating
+    a deactivated user, or an old password or role, until the snapshot expires.
+    Free-slot bitmaps (appointments.availability) are invalidated the same way.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PER_PROCESS_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) isn't shared between processes.",
+        hint="Set CACHE_BACKEND and CACHE_LOCATION to a Redis or Memcached server, "
+             "e.g. django.core.cache.backends.redis.RedisCache and redis://localhost:6379.",
+        id='accounts.E001',
+    )]
@@ -63,6 +63,13 @@ class User(AbstractUser):
         if self.role == 'patient' and not self.phone_number:
             raise ValidationError({'phone_number': 'Patients must have a phone number.'})
 
+    def get_session_auth_hash(self):
+        # Snapshots (accounts.backends) carry the hash instead of the password,
+        # until a new password is set on the instance
+        if 'password' in self.get_deferred_fields() and hasattr(self, 'snapshot_session_auth_hash'):
+            return self.snapshot_session_auth_hash
+        return super().get_session_auth_hash()
+
     @property
     def is_doctor(self):
         return self.role == 'doctor'
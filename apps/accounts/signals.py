@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .backends import invalidate_user_snapshot
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, using, **kwargs):
+    # Now, for this transaction, which already sees the new row, and again after
+    # the commit: another request in between would cache the old row under the new version
+    pk = instance.pk
+    invalidate_user_snapshot(pk)
+    transaction.on_commit(lambda: invalidate_user_snapshot(pk), using=using)
@@ -1,6 +1,11 @@
-from django.test import TestCase, Client
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from .backends import get_user_snapshot, user_version
+from .checks import check_shared_cache
 
 User = get_user_model()
 
@@ -66,3 +71,68 @@ class AuthTests(TestCase):
         self.client.login(email=self.patient.email, password=self.patient_password)
         response = self.client.get(reverse('doctor_dashboard'))
         self.assertEqual(response.status_code, 403)
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(email='cached@test.com', password='pw', role='patient')
+        self.client.login(email='cached@test.com', password='pw')
+
+    def test_warm_request_skips_auth_queries(self):
+        """Session and user are served from the cache after the first request"""
+        self.client.get(reverse('patient_dashboard'))
+        with CaptureQueriesContext(connection) as ctx:
+            user = self.client.get(reverse('patient_dashboard')).wsgi_request.user
+        self.assertEqual(user.email, 'cached@test.com')
+        tables = ('django_session', User._meta.db_table)
+        self.assertFalse([q for q in ctx if any(f'FROM "{t}"' in q['sql'] for t in tables)])
+
+    def test_saving_user_invalidates_snapshot(self):
+        """A role change is picked up on the next request"""
+        self.client.get(reverse('patient_dashboard'))
+        self.user.role = 'doctor'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('patient_dashboard')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('doctor_dashboard')).status_code, 200)
+
+    def test_password_change_ends_session(self):
+        """The session hash is still checked against the cached password"""
+        self.client.get(reverse('patient_dashboard'))
+        self.user.set_password('new-pw')
+        self.user.save()
+        response = self.client.get(reverse('patient_dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_snapshot_cached_before_commit_is_dropped(self):
+        """A request reading the old row before the save commits can't keep it cached"""
+        pk = self.user.pk
+        old_key = f'auth:snapshot:{pk}:{user_version(pk)}'
+        get_user_snapshot(pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.role = 'doctor'
+            self.user.save()
+            # What that request would cache under the version bumped by the save
+            cache.set(f'auth:snapshot:{pk}:{user_version(pk)}', cache.get(old_key))
+            self.assertEqual(get_user_snapshot(pk).role, 'patient')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_user_snapshot(pk).role, 'doctor')
+
+    def test_snapshot_leaves_out_the_password_hash(self):
+        self.client.get(reverse('patient_dashboard'))
+        cached = cache.get(f'auth:snapshot:{self.user.pk}:{user_version(self.user.pk)}')
+        self.assertNotIn(self.user.password, repr(cached))
+        snapshot = get_user_snapshot(self.user.pk)
+        self.assertIn('password', snapshot.get_deferred_fields())
+        self.assertEqual(snapshot.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_refuses_a_per_process_cache_outside_debug(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['accounts.E001'])
+        with override_settings(DEBUG=True, CACHES=locmem):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from apps.appointments.models import Appointment
+from apps.records.models import MedicalRecord
+
+User = get_user_model()
+
+class AppointmentApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='Pat', last_name='One')
+        self.other = User.objects.create_user(email='pat2@test.com', password='pw', role='patient', last_name='Two')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='House')
+        self.admin = User.objects.create_user(email='admin@test.com', password='pw', role='admin')
+        now = timezone.now()
+        self.mine = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now + timedelta(days=i + 1), reason_for_visit=f'Visit {i}')
+            for i in range(5)
+        ]
+        self.theirs = Appointment.objects.create(patient=self.other, doctor=self.doctor, scheduled_time=now + timedelta(days=10))
+
+    def get(self, url, **params):
+        return self.client.get(url, params)
+
+    def test_lists_only_accessible_appointments(self):
+        self.client.login(email=self.patient.email, password='pw')
+        ids = {row['id'] for row in self.get(reverse('api_appointments')).json()['results']}
+        self.assertEqual(ids, {str(a.pk) for a in self.mine})
+
+        self.client.login(email=self.doctor.email, password='pw')
+        self.assertEqual(len(self.get(reverse('api_appointments')).json()['results']), 6)
+        self.client.login(email=self.admin.email, password='pw')
+        self.assertEqual(len(self.get(reverse('api_appointments')).json()['results']), 6)
+
+    def test_sparse_fields(self):
+        self.client.login(email=self.patient.email, password='pw')
+        data = self.get(reverse('api_appointments'), fields='status,doctor_last_name').json()
+        self.assertEqual(data['results'][0], {'status': 'PENDING', 'doctor_last_name': 'House'})
+
+        response = self.get(reverse('api_appointments'), fields='status,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+        # Asking for no fields is an error too, which lists the ones there are
+        for fields in ('', ' , '):
+            response = self.get(reverse('api_appointments'), fields=fields)
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json()['error'].startswith('No fields requested. Available: id,'))
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        self.client.login(email=self.patient.email, password='pw')
+        url, seen = reverse('api_appointments') + '?limit=2&fields=id', []
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [str(a.pk) for a in reversed(self.mine)])
+
+    def test_status_filter(self):
+        Appointment.objects.filter(pk=self.mine[0].pk).transition('confirm')
+        self.client.login(email=self.patient.email, password='pw')
+        data = self.get(reverse('api_appointments'), status='CONFIRMED', fields='id').json()
+        self.assertEqual(data['results'], [{'id': str(self.mine[0].pk)}])
+
+    def test_detail_follows_access_rules(self):
+        self.client.login(email=self.patient.email, password='pw')
+        response = self.get(reverse('api_appointment', args=[self.mine[0].pk]), fields='reason_for_visit')
+        self.assertEqual(response.json(), {'reason_for_visit': 'Visit 0'})
+        self.assertEqual(self.get(reverse('api_appointment', args=[self.theirs.pk])).status_code, 404)
+
+    def test_requires_login(self):
+        response = self.get(reverse('api_appointments'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'Authentication required.'})
+
+    def test_list_query_count(self):
+        self.client.login(email=self.patient.email, password='pw')
+        self.get(reverse('api_appointments'))
+        # The live rows, then the archive, as the page isn't full
+        with self.assertNumQueries(2):
+            self.get(reverse('api_appointments'), fields='id,scheduled_time,doctor_last_name,medical_record_id')
+
+class MedicalRecordApiTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient')
+        self.other = User.objects.create_user(email='pat2@test.com', password='pw', role='patient')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='House')
+        appt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=timezone.now(), status=Appointment.STATUS_COMPLETED)
+        self.record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=appt, diagnosis='Flu', notes='Rest')
+
+    def test_records_follow_view_rules(self):
+        self.client.login(email=self.patient.email, password='pw')
+        data = self.client.get(reverse('api_records'), {'fields': 'id,diagnosis'}).json()
+        self.assertEqual(data, {'results': [{'id': str(self.record.pk), 'diagnosis': 'Flu'}], 'next': None})
+
+        self.client.login(email=self.other.email, password='pw')
+        self.assertEqual(self.client.get(reverse('api_records')).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('api_record', args=[self.record.pk])).status_code, 404)
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('appointments/', views.AppointmentResource.as_view(), name='api_appointments'),
+    path('appointments/<uuid:pk>/', views.AppointmentResource.as_view(), name='api_appointment'),
+    path('records/', views.MedicalRecordResource.as_view(), name='api_records'),
+    path('records/<uuid:pk>/', views.MedicalRecordResource.as_view(), name='api_record'),
+]
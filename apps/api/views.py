@@ -0,0 +1,174 @@
+"""
+Read-only JSON API over appointments and medical records, for the mobile
+client and the front-desk kiosk.
+
+Rows are serialized straight from values_list(): no model instances, no
+templates. Access follows the same rules as the HTML pages, applied as query
+filters (Appointment.objects.accessible_to, MedicalRecord.objects.viewable_by),
+so a row the user may not see is simply not found.
+
+    GET /api/appointments/?fields=id,status&status=CONFIRMED&limit=50&cursor=...
+    GET /api/appointments/<id>/?fields=...
+
+Lists are keyset paginated newest first; `next` is the URL of the following
+page, or null on the last one. Archived appointments are served as if they
+were still in the appointments table.
+"""
+from operator import itemgetter
+from django.http import JsonResponse
+from django.views import View
+from apps.appointments.archive import merge_newest_first, reaches_archive
+from apps.appointments.models import Appointment, ArchivedAppointment
+from apps.core.pagination import cursor_url, encode_cursor, seek
+from apps.records.models import APPOINTMENT_ID, MedicalRecord
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResourceView(View):
+    """
+    GET a list or (with `pk`) one row of a resource.
+
+    `fields` maps output names to values_list() lookups; ?fields= picks a
+    subset. `filters` maps query parameters to exact-match lookups.
+    """
+    http_method_names = ['get', 'head', 'options']
+    read_from_replica = True
+    fields = {}
+    filters = {}
+    order_field = None
+    default_limit = 50
+    max_limit = 200
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if not request.user.is_authenticated:
+                raise ApiError(401, "Authentication required.")
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+    def selected_fields(self):
+        requested = self.request.GET.get('fields')
+        if requested is None:
+            return list(self.fields)
+        names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            # An empty ?fields= lists nothing unknown, but still gets the list of choices
+            problem = f"Unknown fields: {', '.join(unknown)}." if unknown else "No fields requested."
+            raise ApiError(400, f"{problem} Available: {', '.join(self.fields)}.")
+        return names
+
+    def limit(self):
+        value = self.request.GET.get('limit')
+        if value is None:
+            return self.default_limit
+        try:
+            return max(1, min(int(value), self.max_limit))
+        except ValueError:
+            raise ApiError(400, "limit must be a number.")
+
+    def apply_filters(self, queryset):
+        for param, lookup in self.filters.items():
+            if param in self.request.GET:
+                queryset = queryset.filter(**{lookup: self.request.GET[param]})
+        return queryset
+
+    def get_row(self, queryset, pk, lookups):
+        return queryset.filter(pk=pk).values_list(*lookups).first()
+
+    def get_rows(self, queryset, columns, cursor, count):
+        """The first `count` rows after `cursor`, newest first."""
+        return list(seek(queryset, self.order_field, cursor).values_list(*columns)[:count])
+
+    def get(self, request, pk=None):
+        names = self.selected_fields()
+        lookups = [self.fields[name] for name in names]
+        queryset = self.get_queryset()
+
+        if pk is not None:
+            row = self.get_row(queryset, pk, lookups)
+            if row is None:
+                raise ApiError(404, "Not found.")
+            return JsonResponse(dict(zip(names, row)))
+
+        limit = self.limit()
+        # The sort key rides along with each row for the next cursor; zip()
+        # below leaves it out of the output unless it was asked for
+        columns = list(dict.fromkeys([*lookups, self.order_field, 'pk']))
+        rows = self.get_rows(self.apply_filters(queryset), columns, request.GET.get('cursor'), limit + 1)
+        next_url = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            cursor = encode_cursor(last[columns.index(self.order_field)], last[columns.index('pk')])
+            next_url = request.build_absolute_uri(request.path + cursor_url(request, 'cursor', cursor))
+        return JsonResponse({'results': [dict(zip(names, row)) for row in rows], 'next': next_url})
+
+
+class AppointmentResource(ResourceView):
+    fields = {
+        'id': 'pk',
+        'scheduled_time': 'scheduled_time',
+        'status': 'status',
+        'reason_for_visit': 'reason_for_visit',
+        'patient_id': 'patient_id',
+        'patient_first_name': 'patient__first_name',
+        'patient_last_name': 'patient__last_name',
+        'doctor_id': 'doctor_id',
+        'doctor_last_name': 'doctor__last_name',
+        'medical_record_id': 'medical_record__id',
+        'cancellation_reason': 'cancellation_reason',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    filters = {'status': 'status'}
+    order_field = 'scheduled_time'
+
+    def get_queryset(self):
+        return Appointment.objects.accessible_to(self.request.user)
+
+    def get_archived_queryset(self):
+        return ArchivedAppointment.objects.accessible_to(self.request.user)
+
+    def get_row(self, queryset, pk, lookups):
+        row = super().get_row(queryset, pk, lookups)
+        if row is None:
+            row = super().get_row(self.get_archived_queryset(), pk, lookups)
+        return row
+
+    def get_rows(self, queryset, columns, cursor, count):
+        rows = super().get_rows(queryset, columns, cursor, count)
+        scheduled_time = itemgetter(columns.index('scheduled_time'))
+        if reaches_archive(rows, count, scheduled_time, using=queryset.db):
+            archived = self.apply_filters(self.get_archived_queryset())
+            older = super().get_rows(archived, columns, cursor, count)
+            rows = merge_newest_first(rows, older, count, key=itemgetter(columns.index('scheduled_time'), columns.index('pk')))
+        return rows
+
+
+class MedicalRecordResource(ResourceView):
+    fields = {
+        'id': 'pk',
+        'created_at': 'created_at',
+        'appointment_id': APPOINTMENT_ID,
+        'patient_id': 'patient_id',
+        'patient_first_name': 'patient__first_name',
+        'patient_last_name': 'patient__last_name',
+        'doctor_id': 'doctor_id',
+        'doctor_last_name': 'doctor__last_name',
+        'diagnosis': 'diagnosis',
+        'notes': 'notes',
+    }
+    order_field = 'created_at'
+
+    def get_queryset(self):
+        return MedicalRecord.objects.viewable_by(self.request.user)
@@ -1,10 +1,47 @@
-from django.contrib import admin
-from .models import Appointment
+from django.contrib import admin, messages
+from apps.core.admin import LargeTableAdminMixin
+from .models import Appointment, ArchivedAppointment
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('scheduled_time', 'patient', 'doctor', 'status')
+    list_select_related = ('patient', 'doctor')
     list_filter = ('status', 'scheduled_time')
     search_fields = ('patient__email', 'patient__last_name', 'doctor__last_name', 'reason_for_visit')
     date_hierarchy = 'scheduled_time'
     ordering = ('-scheduled_time',)
+    actions = ('confirm_selected', 'cancel_selected', 'complete_selected')
+
+    def _transition(self, request, queryset, action):
+        # One conditional UPDATE; rows in a status the action can't apply to are left alone
+        updated = queryset.transition(action, by=request.user, reason="Cancelled by admin")
+        self.message_user(request, f"{updated} appointment(s) updated.", messages.SUCCESS)
+
+    @admin.action(description="Confirm selected pending appointments")
+    def confirm_selected(self, request, queryset):
+        self._transition(request, queryset, 'confirm')
+
+    @admin.action(description="Cancel selected appointments")
+    def cancel_selected(self, request, queryset):
+        self._transition(request, queryset, 'cancel')
+
+    @admin.action(description="Complete selected confirmed appointments")
+    def complete_selected(self, request, queryset):
+        self._transition(request, queryset, 'complete')
+
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('scheduled_time', 'patient', 'doctor', 'status', 'archived_at')
+    list_select_related = ('patient', 'doctor')
+    list_filter = ('status',)
+    search_fields = ('patient__email', 'patient__last_name', 'doctor__last_name')
+    date_hierarchy = 'scheduled_time'
+    ordering = ('-scheduled_time',)
+
+    # Archived appointments are moved here by archive_appointments and never change
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
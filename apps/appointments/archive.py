@@ -0,0 +1,93 @@
+"""
+Hot/cold split of appointments.
+
+Completed and cancelled appointments never change again, yet every schedule
+query walks their index entries. archive_appointments moves old ones into
+ArchivedAppointment in bounded batches, keeping their ids, and moves their
+medical record's link along in the same transaction, so the Appointment table
+holds little more than the booking window.
+
+History lists read both tables as one: a page is read from the live table
+first, and from the archive only when it reaches back to the newest archived
+appointment (archived_until(), one index lookup), so recent history costs no
+more than before.
+"""
+import heapq
+from datetime import timedelta
+from itertools import islice
+from django.db import transaction
+from django.db.models import F, Max
+from apps.core.pagination import keyset_page, seek
+from apps.records.models import MedicalRecord
+from .models import Appointment, ArchivedAppointment
+
+ARCHIVE_BATCH_SIZE = 1000
+# Doctors write a completed visit's medical record against the live table
+ARCHIVE_MIN_AGE = timedelta(days=30)
+
+
+def archived_until(using=None):
+    """scheduled_time of the newest archived appointment, or None while the archive is empty."""
+    # Not cached: every worker has to see a batch as soon as it is committed.
+    # Read from the same database as the live rows, which a batch moves together.
+    return ArchivedAppointment.objects.db_manager(using).aggregate(latest=Max('scheduled_time'))['latest']
+
+
+def reaches_archive(rows, count, scheduled_time, using=None):
+    """
+    Whether archived appointments may belong among `rows`, the first `count`
+    live rows of a history page, newest first. They can't when the live rows
+    fill the page and end after the newest archived appointment.
+    """
+    # A short page reads the archive anyway, which costs no more than the horizon
+    if len(rows) < count:
+        return True
+    until = archived_until(using)
+    return until is not None and scheduled_time(rows[-1]) <= until
+
+
+def merge_newest_first(rows, older, count, key):
+    """The first `count` of two lists that are each sorted newest first by `key`."""
+    return list(islice(heapq.merge(rows, older, key=key, reverse=True), count))
+
+
+def history_page(live, archived, cursor=None, per_page=20):
+    """
+    paginate_keyset() on scheduled_time over `live` appointments and the
+    `archived` ones matching the same filters, as one list.
+    """
+    rows = list(seek(live, 'scheduled_time', cursor)[:per_page + 1])
+    if reaches_archive(rows, per_page + 1, lambda appt: appt.scheduled_time, using=live.db):
+        older = seek(archived, 'scheduled_time', cursor)[:per_page + 1]
+        rows = merge_newest_first(rows, older, per_page + 1, key=lambda appt: (appt.scheduled_time, appt.pk))
+    return keyset_page(rows, 'scheduled_time', per_page)
+
+
+def archive_appointments(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move finished appointments scheduled before `before` into the archive,
+    oldest first, one transaction per `batch_size` rows. Yields the number
+    moved by each batch.
+    """
+    finished = Appointment.objects.filter(
+        status__in=Appointment.FINISHED_STATUSES, scheduled_time__lt=before
+    ).order_by('scheduled_time', 'pk')
+    fields = [field.attname for field in Appointment._meta.concrete_fields]
+    while True:
+        with transaction.atomic():
+            # Locked, so a record being created for one of them waits and then
+            # fails instead of pointing at a row that is gone
+            ids = list(finished.select_for_update().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            batch = Appointment.objects.filter(pk__in=ids)
+            ArchivedAppointment.objects.bulk_create(ArchivedAppointment(**values) for values in batch.values(*fields))
+            # Not an edit of the record: it keeps pointing at the same appointment id
+            MedicalRecord.objects.filter(appointment__in=ids).update(
+                archived_appointment=F('appointment'), appointment=None
+            )
+            # One DELETE: delete() would load the rows to send post_delete for each,
+            # and their records were unlinked above. Finished appointments hold no
+            # slot, so there is no availability to invalidate.
+            batch._raw_delete(batch.db)
+        yield len(ids)
@@ -0,0 +1,122 @@
+"""
+Free-slot engine for doctor schedules.
+
+Each doctor's day is a grid of fixed-length slots between opening and closing
+time. A day is stored in the cache as an integer bitmap where bit ``i`` is set
+when slot ``i`` holds a PENDING or CONFIRMED appointment. Missing days are
+filled with a single range query per doctor, and a day's bitmap is dropped
+whenever an appointment on that day is saved or deleted.
+
+Bitmaps are dropped by whichever process made the change, e.g. the web worker
+or import_appointments, so the cache must be shared between processes. A
+local-memory cache is refused by `check --deploy` outside DEBUG (accounts.E001).
+"""
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import Appointment, BOOKING_WINDOW
+
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+
+
+def slot_minutes():
+    return getattr(settings, 'CLINIC_SLOT_MINUTES', 30)
+
+
+def slots_per_day():
+    opening = getattr(settings, 'CLINIC_OPENING_HOUR', 9)
+    closing = getattr(settings, 'CLINIC_CLOSING_HOUR', 17)
+    return (closing - opening) * 60 // slot_minutes()
+
+
+def slot_start(day, index):
+    """Aware datetime at which slot `index` of `day` begins."""
+    opening = getattr(settings, 'CLINIC_OPENING_HOUR', 9)
+    start = datetime.combine(day, time(opening)) + timedelta(minutes=index * slot_minutes())
+    return timezone.make_aware(start)
+
+
+def slot_index(scheduled_time):
+    """Slot an appointment falls into, or None if it is outside opening hours."""
+    local = timezone.localtime(scheduled_time)
+    opening = getattr(settings, 'CLINIC_OPENING_HOUR', 9)
+    minutes = (local.hour - opening) * 60 + local.minute
+    if minutes < 0:
+        return None
+    index = minutes // slot_minutes()
+    return index if index < slots_per_day() else None
+
+
+def _cache_key(doctor_id, day):
+    return f'availability:{doctor_id}:{day.isoformat()}'
+
+
+def get_day_bitmaps(doctor_id, start_day, end_day):
+    """Return {day: bitmap} for every day from start_day to end_day inclusive."""
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    keys = {_cache_key(doctor_id, day): day for day in days}
+    bitmaps = {keys[key]: bitmap for key, bitmap in cache.get_many(list(keys)).items()}
+
+    missing = [day for day in days if day not in bitmaps]
+    if missing:
+        fresh = {day: 0 for day in missing}
+        # One range query covers every uncached day
+        booked = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            status__in=Appointment.ACTIVE_STATUSES,
+            scheduled_time__gte=timezone.make_aware(datetime.combine(missing[0], time.min)),
+            scheduled_time__lt=timezone.make_aware(datetime.combine(missing[-1] + timedelta(days=1), time.min)),
+        ).values_list('scheduled_time', flat=True)
+        for scheduled_time in booked:
+            day = timezone.localtime(scheduled_time).date()
+            index = slot_index(scheduled_time)
+            if day in fresh and index is not None:
+                fresh[day] |= 1 << index
+        cache.set_many({_cache_key(doctor_id, day): bitmap for day, bitmap in fresh.items()}, AVAILABILITY_CACHE_TIMEOUT)
+        bitmaps.update(fresh)
+    return bitmaps
+
+
+def free_slots(doctor_id, start_day, end_day, now=None):
+    """List the bookable slot start times for a doctor between two dates."""
+    now = now or timezone.now()
+    latest = now + BOOKING_WINDOW
+    bitmaps = get_day_bitmaps(doctor_id, start_day, end_day)
+    slots = []
+    for day in sorted(bitmaps):
+        bitmap = bitmaps[day]
+        for index in range(slots_per_day()):
+            if bitmap >> index & 1:
+                continue
+            start = slot_start(day, index)
+            if now < start <= latest:
+                slots.append(start)
+    return slots
+
+
+def invalidate_slots(bookings):
+    """Drop cached bitmaps for many (doctor_id, scheduled_time) pairs at once."""
+    keys = {_cache_key(doctor_id, timezone.localtime(scheduled_time).date()) for doctor_id, scheduled_time in bookings}
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def invalidate_slots_on_commit(bookings, using=None):
+    """
+    invalidate_slots() now, and again once the current transaction commits:
+    a read in between rebuilds the bitmap from the rows before the change and
+    would otherwise keep it cached for AVAILABILITY_CACHE_TIMEOUT.
+    """
+    bookings = list(bookings)
+    invalidate_slots(bookings)
+    transaction.on_commit(lambda: invalidate_slots(bookings), using=using)
+
+
+def invalidate_doctor(doctor_id):
+    """Drop every cached bitmap of a doctor inside the booking window."""
+    today = timezone.localdate()
+    cache.delete_many([
+        _cache_key(doctor_id, today + timedelta(days=i)) for i in range(BOOKING_WINDOW.days + 1)
+    ])
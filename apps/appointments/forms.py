@@ -17,24 +17,21 @@ class AppointmentBookingForm(forms.ModelForm):
         self.instance.patient = user
         # Filter doctors only
         self.fields['doctor'].queryset = User.objects.filter(role='doctor')
-        
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Double booking is caught by the unique_active_doctor_slot constraint when
+        # the row is inserted (see BookAppointmentView), so skip the pre-check query
+        # model validation would otherwise run for it
+        exclude.add('scheduled_time')
+        return exclude
+
+    def add_slot_taken_error(self):
+        self.add_error('scheduled_time', "This time slot is already booked.")
+
     def clean_scheduled_time(self):
         scheduled_time = self.cleaned_data.get('scheduled_time')
         if scheduled_time:
              if scheduled_time < timezone.now():
                 raise forms.ValidationError("Cannot book appointments in the past.")
-             
-             # Check for overlapping appointments (PENDING or CONFIRMED) for this doctor
-             doctor = self.cleaned_data.get('doctor')
-             if doctor:
-                 # Check if any appointment exists for this doctor at this time
-                 # Note: self.cleaned_data.get('doctor') might be missing if field validation failed? 
-                 # But doctor is required field.
-                 exists = Appointment.objects.filter(
-                     doctor=doctor,
-                     scheduled_time=scheduled_time,
-                     status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-                 ).exists()
-                 if exists:
-                     raise forms.ValidationError("This time slot is already booked.")
         return scheduled_time
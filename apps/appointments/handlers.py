@@ -0,0 +1,21 @@
+"""Outbox handlers for appointment events (run by run_outbox_worker)."""
+import logging
+from apps.core import outbox
+
+audit = logging.getLogger('apps.audit')
+
+
+@outbox.handler('appointment.booked')
+def audit_booking(payload):
+    audit.info(
+        "appointment booked id=%s patient=%s doctor=%s at=%s",
+        payload['appointment_id'], payload['patient_id'], payload['doctor_id'], payload['scheduled_time'],
+    )
+
+
+@outbox.handler('appointment.status_changed')
+def audit_status_change(payload):
+    audit.info(
+        "appointments %s -> %s by=%s ids=%s",
+        payload['action'], payload['status'], payload['by'], ','.join(map(str, payload['appointment_ids'])),
+    )
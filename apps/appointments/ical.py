@@ -0,0 +1,153 @@
+"""
+Per-doctor iCalendar feed of confirmed appointments.
+
+Feeds are addressed by a token instead of a login, since calendar clients poll
+without a session. The token is an HMAC over the doctor's id and session auth
+hash, which is derived from the password, so changing the password revokes old
+feed URLs.
+
+The ETag comes from the latest updated_at and the row count of the doctor's
+appointments, both answered from the (doctor, updated_at) index, plus the
+snapshot versions of the doctor and of the patients in the feed, whose names it
+shows. Each rendered VEVENT is cached under its (id, updated_at, patient
+version), so after a change only the changed appointments are rendered again.
+"""
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from apps.accounts.backends import get_user_snapshot, user_version, user_versions
+from apps.core.conditional import counterpart_versions
+from .availability import slot_minutes
+from .models import Appointment, BOOKING_WINDOW
+
+# How far back the feed keeps past appointments
+FEED_HISTORY = timedelta(days=30)
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+TOKEN_SALT = 'apps.appointments.ical'
+
+
+def calendar_token(doctor):
+    # Not the password itself, which user snapshots don't carry
+    digest = salted_hmac(TOKEN_SALT, f'{doctor.pk}:{doctor.get_session_auth_hash()}').hexdigest()[:32]
+    return f'{doctor.pk}-{digest}'
+
+
+def doctor_for_token(token):
+    """The doctor a feed token belongs to, or None. Served from the user snapshot cache."""
+    pk = token.partition('-')[0]
+    if not pk.isdigit():
+        return None
+    doctor = get_user_snapshot(int(pk))
+    if doctor is None or not doctor.is_active or not doctor.is_doctor:
+        return None
+    return doctor if constant_time_compare(calendar_token(doctor), token) else None
+
+
+def feed_appointments(doctor_id, now=None):
+    """The appointments a doctor's feed lists."""
+    now = now or timezone.now()
+    return Appointment.objects.filter(
+        doctor_id=doctor_id,
+        status=Appointment.STATUS_CONFIRMED,
+        scheduled_time__gte=now - FEED_HISTORY,
+        scheduled_time__lte=now + BOOKING_WINDOW,
+    )
+
+
+def feed_etag(doctor_id):
+    stats = Appointment.objects.filter(doctor_id=doctor_id).aggregate(latest=Max('updated_at'), rows=Count('updated_at'))
+    latest = stats['latest'].timestamp() if stats['latest'] else 0
+    # The calendar name and event summaries show names, which can change without touching the rows
+    patients = counterpart_versions(feed_appointments(doctor_id).values_list('patient_id', flat=True))
+    names = hashlib.md5(repr([user_version(doctor_id), *patients]).encode()).hexdigest()[:12]
+    return f'{doctor_id}-{latest:.6f}-{stats["rows"]}-{names}'
+
+
+def escape_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # Don't split a multi-byte character
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        start, limit = end, 74
+    return '\r\n '.join(parts)
+
+
+def format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_event(appointment):
+    patient = appointment.patient
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{appointment.pk}@clinic',
+        f'DTSTAMP:{format_utc(appointment.updated_at)}',
+        f'DTSTART:{format_utc(appointment.scheduled_time)}',
+        f'DTEND:{format_utc(appointment.scheduled_time + timedelta(minutes=slot_minutes()))}',
+        f'SUMMARY:{escape_text(f"Appointment: {patient.first_name} {patient.last_name}".strip())}',
+        f'DESCRIPTION:{escape_text(appointment.reason_for_visit)}',
+        'STATUS:CONFIRMED',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def _event_key(pk, updated_at, patient_version):
+    return f'ical:event:{pk}:{updated_at.timestamp():.6f}:{patient_version}'
+
+
+def render_feed(doctor):
+    """The full VCALENDAR body for `doctor`, re-rendering only events not in the cache."""
+    confirmed = feed_appointments(doctor.pk)
+    stamps = list(confirmed.order_by('scheduled_time').values_list('pk', 'updated_at', 'patient_id'))
+    patient_ids = sorted({patient_id for _, _, patient_id in stamps})
+    versions = dict(zip(patient_ids, user_versions(patient_ids)))
+    keys = [_event_key(pk, updated_at, versions[patient_id]) for pk, updated_at, patient_id in stamps]
+    events = cache.get_many(keys)
+
+    missing = [pk for (pk, _, _), key in zip(stamps, keys) if key not in events]
+    if missing:
+        fresh = {}
+        rows = confirmed.filter(pk__in=missing).select_related('patient').only(
+            'scheduled_time', 'updated_at', 'reason_for_visit', 'patient__first_name', 'patient__last_name'
+        )
+        for appointment in rows:
+            key = _event_key(appointment.pk, appointment.updated_at, versions[appointment.patient_id])
+            fresh[key] = render_event(appointment)
+        cache.set_many(fresh, FEED_CACHE_TIMEOUT)
+        events.update(fresh)
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Clinic Management//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        fold(f'X-WR-CALNAME:{escape_text(f"Dr. {doctor.last_name} - Appointments")}'),
+    ]
+    header = ''.join(line + '\r\n' for line in lines)
+    return header + ''.join(events[key] for key in keys if key in events) + 'END:VCALENDAR\r\n'
+
+
+def cached_feed(doctor, etag):
+    """render_feed(), memoized per ETag so repeat polls without If-None-Match skip the rows too."""
+    key = f'ical:feed:{etag}'
+    body = cache.get(key)
+    if body is None:
+        body = render_feed(doctor)
+        cache.set(key, body, FEED_CACHE_TIMEOUT)
+    return body
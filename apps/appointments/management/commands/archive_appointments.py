@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.appointments.archive import ARCHIVE_BATCH_SIZE, ARCHIVE_MIN_AGE, archive_appointments
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and cancelled appointments scheduled more than --older-than days ago "
+        "into the archive table, one transaction per batch. Safe to stop and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=365, help="Age in days (default 365).")
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # Recent visits may still be waiting for their medical record
+        if options['older_than'] < ARCHIVE_MIN_AGE.days:
+            raise CommandError(f"--older-than must be at least {ARCHIVE_MIN_AGE.days} days.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        before = timezone.now() - timedelta(days=options['older_than'])
+        archived = 0
+        for count in archive_appointments(before, options['batch_size']):
+            archived += count
+            self.stdout.write(f"Archived {archived} appointments...")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} appointments scheduled before {before:%Y-%m-%d}."))
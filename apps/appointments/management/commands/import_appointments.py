@@ -0,0 +1,184 @@
+import csv
+import json
+import sys
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.accounts.models import User
+from apps.appointments.availability import invalidate_slots
+from apps.appointments.models import Appointment
+
+# The columns a row is read from; any other keys are ignored
+COLUMNS = ('doctor_email', 'patient_email', 'scheduled_time', 'reason_for_visit', 'status', 'cancellation_reason')
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import appointments from CSV or NDJSON. Each row needs doctor_email, "
+        "patient_email and scheduled_time; reason_for_visit may be empty and status "
+        "defaults to PENDING."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--reject-file', help="Write rejected rows here as NDJSON with the reason.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        fmt = options['format'] or ('ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+        try:
+            rejects = open(options['reject_file'], 'w', encoding='utf-8') if options['reject_file'] else None
+        except OSError as e:
+            if stream is not sys.stdin:
+                stream.close()
+            raise CommandError(f"Cannot write {options['reject_file']}: {e}")
+        self.rejected = 0
+        self.rejects = rejects
+        imported = 0
+        try:
+            rows = self.read_rows(stream, fmt)
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                imported += self.import_chunk(chunk)
+                self.stdout.write(f"Imported {imported} appointments, rejected {self.rejected}...")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} appointments, rejected {self.rejected}."))
+
+    def read_rows(self, stream, fmt):
+        """Yield (line_number, row) lazily so the input is never held in memory."""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            # Unusable lines are passed on as '_raw' with the reason, for the reject file
+            raw = {'_raw': line.rstrip('\n')}
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, {**raw, '_error': 'Invalid JSON.'}
+                continue
+            if not isinstance(row, dict):
+                yield line_number, {**raw, '_error': 'Expected a JSON object.'}
+                continue
+            # CSV gives strings only; null is read as an empty value
+            fields = [name for name in COLUMNS if not isinstance(row.get(name), (str, type(None)))]
+            if fields:
+                yield line_number, {**raw, '_error': f"Expected text for {', '.join(fields)}."}
+                continue
+            yield line_number, row
+
+    def reject(self, line_number, row, reason):
+        self.rejected += 1
+        if self.rejects:
+            self.rejects.write(json.dumps({'line': line_number, 'reason': reason, 'row': row}) + '\n')
+
+    def import_chunk(self, chunk):
+        # One lookup resolves every email in the chunk
+        emails = set()
+        for _, row in chunk:
+            emails.add((row.get('doctor_email') or '').strip())
+            emails.add((row.get('patient_email') or '').strip())
+        users = {
+            email: (pk, role)
+            for email, pk, role in User.objects.filter(email__in=emails).values_list('email', 'id', 'role')
+        }
+
+        statuses = dict(Appointment.STATUS_CHOICES)
+        parsed = []
+        for line_number, row in chunk:
+            if '_raw' in row:
+                self.reject(line_number, {'_raw': row['_raw']}, row['_error'])
+                continue
+            doctor = users.get((row.get('doctor_email') or '').strip())
+            patient = users.get((row.get('patient_email') or '').strip())
+            if not doctor or doctor[1] != 'doctor':
+                self.reject(line_number, row, 'Unknown doctor.')
+                continue
+            if not patient or patient[1] != 'patient':
+                self.reject(line_number, row, 'Unknown patient.')
+                continue
+            try:
+                scheduled_time = parse_datetime((row.get('scheduled_time') or '').strip())
+            except ValueError:
+                scheduled_time = None
+            if scheduled_time is None:
+                self.reject(line_number, row, 'Invalid scheduled_time.')
+                continue
+            if timezone.is_naive(scheduled_time):
+                scheduled_time = timezone.make_aware(scheduled_time)
+            status = (row.get('status') or Appointment.STATUS_PENDING).strip().upper()
+            if status not in statuses:
+                self.reject(line_number, row, 'Invalid status.')
+                continue
+            parsed.append((line_number, row, Appointment(
+                doctor_id=doctor[0],
+                patient_id=patient[0],
+                scheduled_time=scheduled_time,
+                status=status,
+                reason_for_visit=row.get('reason_for_visit') or '',
+                cancellation_reason=row.get('cancellation_reason') or None,
+            )))
+
+        # Check double bookings in memory against one range query for the chunk
+        active = [item for item in parsed if item[2].status in Appointment.ACTIVE_STATUSES]
+        booked = set()
+        if active:
+            times = [appt.scheduled_time for _, _, appt in active]
+            booked = set(Appointment.objects.filter(
+                doctor_id__in={appt.doctor_id for _, _, appt in active},
+                status__in=Appointment.ACTIVE_STATUSES,
+                scheduled_time__range=(min(times), max(times)),
+            ).values_list('doctor_id', 'scheduled_time'))
+
+        accepted = []
+        for line_number, row, appt in parsed:
+            if appt.status in Appointment.ACTIVE_STATUSES:
+                slot = (appt.doctor_id, appt.scheduled_time)
+                if slot in booked:
+                    self.reject(line_number, row, 'Time slot already booked.')
+                    continue
+                booked.add(slot)
+            accepted.append((line_number, row, appt))
+
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create([appt for _, _, appt in accepted])
+            created = accepted
+        except IntegrityError:
+            # A booking landed concurrently - fall back to row-by-row so only the clashes are rejected
+            created = []
+            for line_number, row, appt in accepted:
+                try:
+                    with transaction.atomic():
+                        appt.save(force_insert=True)
+                    created.append((line_number, row, appt))
+                except IntegrityError:
+                    self.reject(line_number, row, 'Time slot already booked.')
+
+        # bulk_create skips post_save, so drop the affected availability days explicitly.
+        # This reaches the web workers through the shared cache (see availability).
+        invalidate_slots(
+            (appt.doctor_id, appt.scheduled_time) for _, _, appt in created
+            if appt.status in Appointment.ACTIVE_STATUSES
+        )
+        return len(created)
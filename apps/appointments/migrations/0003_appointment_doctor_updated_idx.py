@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_unique_active_doctor_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'updated_at'], name='appointment_doctor__01e3e8_idx'),
+        ),
+    ]
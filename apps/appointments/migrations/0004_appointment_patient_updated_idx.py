@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_doctor_updated_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'updated_at'], name='appointment_patient_2a0c74_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_patient_updated_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('scheduled_time', models.DateTimeField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('CONFIRMED', 'Confirmed'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=10)),
+                ('reason_for_visit', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('cancellation_reason', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('cancelled_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_cancelled_appointments', to=settings.AUTH_USER_MODEL)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_doctor_appointments', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-scheduled_time'],
+                'indexes': [models.Index(fields=['patient', 'scheduled_time'], name='appointment_patient_d29858_idx'), models.Index(fields=['doctor', 'scheduled_time'], name='appointment_doctor__f5ca5d_idx'), models.Index(fields=['scheduled_time'], name='appointment_schedul_f263eb_idx')],
+            },
+        ),
+    ]
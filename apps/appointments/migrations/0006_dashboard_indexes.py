@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+from apps.core.operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('appointments', '0005_archivedappointment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='appointment',
+            name='appointment_doctor__649ad1_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ['PENDING', 'CONFIRMED'])), fields=['patient', 'scheduled_time'], name='appt_patient_active_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status__in', ['COMPLETED', 'CANCELLED'])), fields=['patient', 'scheduled_time'], name='appt_patient_finished_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED')), fields=['doctor', 'scheduled_time'], name='appt_doctor_completed_idx'),
+        ),
+    ]
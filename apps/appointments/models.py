@@ -1,10 +1,72 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.dispatch import Signal
 from django.utils import timezone
 from datetime import timedelta
 
+# How far ahead patients may book
+BOOKING_WINDOW = timedelta(days=90)
+
+# Sent after AppointmentQuerySet.transition() changes rows, inside the same
+# transaction. update() bypasses post_save, so caches keyed on appointment state
+# and the outbox listen for this instead. `bookings` lists the (doctor_id,
+# scheduled_time) slots the change freed, empty when it left them taken.
+appointment_status_changed = Signal()
+
+
+class AppointmentQuerySet(models.QuerySet):
+    def accessible_to(self, user):
+        """The appointments `user` may see: Appointment.is_accessible_by() as a filter."""
+        if user.role == 'admin':
+            return self.all()
+        # clean() keeps patients and doctors apart, so one side of the rule is
+        # enough, and each side has its own index
+        if user.role == 'patient':
+            return self.filter(patient=user)
+        if user.role == 'doctor':
+            return self.filter(doctor=user)
+        return self.filter(Q(patient=user) | Q(doctor=user))
+
+    def transition(self, action, by=None, reason=None, appointment_ids=None):
+        """
+        Apply a state-machine `action` to every appointment in the queryset whose
+        current status allows it, with one conditional UPDATE.
+
+        Returns the number of rows changed. `appointment_ids` may be passed when
+        the caller already knows which appointments are affected, which saves a
+        lookup unless the change frees their slots.
+        """
+        if action not in self.model.TRANSITIONS:
+            raise ValueError(f"Unknown appointment action: {action}")
+        sources, target = self.model.TRANSITIONS[action]
+
+        changes = {'status': target, 'updated_at': timezone.now()}
+        if target == self.model.STATUS_CANCELLED:
+            changes['cancelled_by'] = by
+            changes['cancellation_reason'] = reason
+        # No savepoint: receivers write in the caller's transaction or this one
+        with transaction.atomic(savepoint=False):
+            count = self.filter(status__in=sources).update(**changes)
+            if count:
+                bookings = []
+                if target not in self.model.ACTIVE_STATUSES:
+                    # The rows this UPDATE touched are the ones it stamped
+                    rows = list(self.filter(status=target, updated_at=changes['updated_at']).values_list(
+                        'pk', 'doctor_id', 'scheduled_time'
+                    ))
+                    bookings = [(doctor_id, scheduled_time) for _, doctor_id, scheduled_time in rows]
+                    appointment_ids = [pk for pk, _, _ in rows]
+                appointment_status_changed.send(
+                    sender=self.model, queryset=self, action=action, target=target, by=by,
+                    changed_at=changes['updated_at'], count=count,
+                    bookings=bookings, appointment_ids=appointment_ids
+                )
+        return count
+
+
 # Create your models here.
 class Appointment(models.Model):
     STATUS_PENDING = 'PENDING'
@@ -19,6 +81,18 @@ class Appointment(models.Model):
         (STATUS_CANCELLED, 'Cancelled'),
     )
 
+    # Statuses that occupy the doctor's time slot
+    ACTIVE_STATUSES = (STATUS_PENDING, STATUS_CONFIRMED)
+    # Statuses no action leads out of; old ones may be archived
+    FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_CANCELLED)
+
+    # action -> (statuses it can be applied from, resulting status)
+    TRANSITIONS = {
+        'confirm': ((STATUS_PENDING,), STATUS_CONFIRMED),
+        'cancel': ((STATUS_PENDING, STATUS_CONFIRMED), STATUS_CANCELLED),
+        'complete': ((STATUS_CONFIRMED,), STATUS_COMPLETED),
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -49,17 +123,61 @@ class Appointment(models.Model):
     )
     cancellation_reason = models.TextField(blank=True, null=True)
 
+    objects = AppointmentQuerySet.as_manager()
+
+    is_archived = False
+
     class Meta:
+        # One per query shape; check_query_plans EXPLAINs the dashboards against
+        # them. The foreign keys' own indexes cover lookups by doctor or patient alone.
         indexes = [
-            models.Index(fields=['doctor']),
             models.Index(fields=['scheduled_time']),
+            # The doctor's agenda scan and the calendar feed. Free slots use the
+            # partial index behind unique_active_doctor_slot.
             models.Index(fields=['doctor', 'scheduled_time']),
+            # Latest change per doctor/patient, for the calendar feed's and dashboards' ETags
+            models.Index(fields=['doctor', 'updated_at']),
+            models.Index(fields=['patient', 'updated_at']),
+            # Partial indexes hold only the rows their page lists: a patient's
+            # upcoming bookings, their history, and a doctor's completed visits
+            models.Index(
+                fields=['patient', 'scheduled_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='appt_patient_active_idx',
+            ),
+            models.Index(
+                fields=['patient', 'scheduled_time'],
+                condition=models.Q(status__in=['COMPLETED', 'CANCELLED']),
+                name='appt_patient_finished_idx',
+            ),
+            models.Index(
+                fields=['doctor', 'scheduled_time'],
+                condition=models.Q(status='COMPLETED'),
+                name='appt_doctor_completed_idx',
+            ),
+        ]
+        constraints = [
+            # A doctor's slot can hold only one active booking. Enforced by the
+            # database so concurrent bookings cannot both succeed.
+            models.UniqueConstraint(
+                fields=['doctor', 'scheduled_time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='unique_active_doctor_slot',
+                violation_error_message='This time slot is already booked.',
+            ),
         ]
         ordering = ['-scheduled_time']
 
     def __str__(self):
         return f"{self.patient} with {self.doctor} at {self.scheduled_time}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the slot we were loaded with, so a reschedule can invalidate it too
+        instance._loaded_scheduled_time = instance.__dict__.get('scheduled_time')
+        return instance
+
     def clean(self):
         # 1. Enforce Role Validation (Double check strictly)
         if self.patient.role != 'patient':
@@ -73,30 +191,13 @@ class Appointment(models.Model):
             if self.scheduled_time < now:
                 raise ValidationError({'scheduled_time': 'Appointments cannot be scheduled in the past.'})
             
-            future_window = now + timedelta(days=90)
+            future_window = now + BOOKING_WINDOW
             if self.scheduled_time > future_window:
                 raise ValidationError({'scheduled_time': 'Appointments must be within the next 90 days.'})
 
-        # 3. Double Booking Check (Only for CONFIRMED appointments)
-        # Check against existing CONFIRMED appointments for the same doctor at the same time
-        # Exclude self if editing
-        
-        # Note: We are checking for EXACT time match as per "A doctor cannot have two CONFIRMED appointments at the same time"
-        # In a real scheduling system, we might check for time slots/duration overlap.
-        # Assuming appointments are point-in-time or we rely on exact match for now based on requirement "at the same time".
-        
-        overlapping = Appointment.objects.filter(
-            doctor=self.doctor,
-            scheduled_time=self.scheduled_time,
-            status=self.STATUS_CONFIRMED
-        )
-        if self.pk:
-            overlapping = overlapping.exclude(pk=self.pk)
-            
-        if overlapping.exists():
-             # If THIS appointment is also being set to CONFIRMED (or is already), it's a conflict
-             if self.status == self.STATUS_CONFIRMED:
-                 raise ValidationError("This doctor already has a confirmed appointment at this time.")
+        # 3. Double Booking Check
+        # Handled by the unique_active_doctor_slot constraint: Django validates it in
+        # full_clean() (admin), and the database rejects concurrent inserts that race past.
 
     def can_be_cancelled(self):
         return self.status in [self.STATUS_PENDING, self.STATUS_CONFIRMED]
@@ -108,8 +209,77 @@ class Appointment(models.Model):
         return self.status in [self.STATUS_PENDING, self.STATUS_CONFIRMED]
 
     def is_accessible_by(self, user):
-        if user == self.patient or user == self.doctor:
+        # Compare ids so the check doesn't load the related users
+        if user.pk in (self.patient_id, self.doctor_id):
             return True
         if user.role == 'admin':
             return True
-        return False
\ No newline at end of file
+        return False
+
+
+class ArchivedAppointmentQuerySet(models.QuerySet):
+    # Archived appointments are seen by the same people as live ones
+    accessible_to = AppointmentQuerySet.accessible_to
+
+
+class ArchivedAppointment(models.Model):
+    """
+    A finished appointment moved out of Appointment by archive_appointments,
+    with the same id and columns. Read-only: nothing happens to an appointment
+    once it is completed or cancelled.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    patient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_patient_appointments',
+    )
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_doctor_appointments',
+    )
+    scheduled_time = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    reason_for_visit = models.TextField()
+
+    # Copied from the live row, not stamped again
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    cancelled_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_cancelled_appointments'
+    )
+    cancellation_reason = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ArchivedAppointmentQuerySet.as_manager()
+
+    is_archived = True
+    is_accessible_by = Appointment.is_accessible_by
+
+    class Meta:
+        indexes = [
+            # History pages, newest first per patient or doctor
+            models.Index(fields=['patient', 'scheduled_time']),
+            models.Index(fields=['doctor', 'scheduled_time']),
+            # Latest archived appointment, see archive.archived_until()
+            models.Index(fields=['scheduled_time']),
+        ]
+        ordering = ['-scheduled_time']
+
+    def __str__(self):
+        return f"{self.patient} with {self.doctor} at {self.scheduled_time} (archived)"
+
+    def can_be_cancelled(self):
+        return False
+
+    def can_be_completed(self):
+        return False
+
+    def is_editable(self):
+        return False
@@ -0,0 +1,68 @@
+from django.utils import timezone
+from .models import Appointment
+
+# Completed visits per dashboard page, see doctor_completed_appointments()
+AGENDA_COMPLETED_LIMIT = 10
+
+# Columns the doctor dashboard renders for each appointment (updated_at keys the cached rows)
+AGENDA_FIELDS = (
+    'scheduled_time', 'status', 'reason_for_visit', 'updated_at',
+    'patient__first_name', 'patient__last_name', 'medical_record__id',
+)
+
+
+class DoctorAgenda:
+    """A doctor's appointments split into the buckets shown on the dashboard."""
+
+    def __init__(self, today, upcoming, pending):
+        self.today = today
+        self.upcoming = upcoming
+        self.pending = pending
+
+
+def agenda_appointments(doctor, since):
+    """The rows get_doctor_agenda() scans: `doctor`'s open appointments from `since` on, oldest first."""
+    return Appointment.objects.filter(
+        doctor=doctor,
+        scheduled_time__gte=since,
+        status__in=Appointment.ACTIVE_STATUSES
+    ).select_related('patient', 'medical_record').only(*AGENDA_FIELDS).order_by('scheduled_time', 'pk')
+
+
+def get_doctor_agenda(doctor, now=None):
+    """
+    Build the agenda for `doctor` from a single scan of their appointments.
+
+    The scan starts at the beginning of today and walks the (doctor,
+    scheduled_time) index; rows are partitioned into buckets in Python
+    instead of issuing one query per bucket.
+    """
+    now = now or timezone.now()
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    rows = agenda_appointments(doctor, today_start)
+
+    today, upcoming, pending = [], [], []
+    for appt in rows:
+        if appt.status == Appointment.STATUS_CONFIRMED:
+            if today_start <= appt.scheduled_time <= today_end:
+                today.append(appt)
+            elif appt.scheduled_time > today_end:
+                upcoming.append(appt)
+        elif appt.scheduled_time >= now:
+            pending.append(appt)
+
+    return DoctorAgenda(today, upcoming, pending)
+
+
+def doctor_completed_appointments(doctor, model=Appointment):
+    """
+    Full completed history for `doctor`, paged newest first on the dashboard
+    through the (doctor, scheduled_time) partial index. Pass
+    model=ArchivedAppointment for the archived part.
+    """
+    return model.objects.filter(
+        doctor=doctor,
+        status=Appointment.STATUS_COMPLETED
+    ).select_related('patient', 'medical_record').only(*AGENDA_FIELDS)
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.core import outbox
+from .models import Appointment, appointment_status_changed
+from .availability import invalidate_slots_on_commit
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_availability(sender, instance, using, **kwargs):
+    bookings = [(instance.doctor_id, instance.scheduled_time)]
+    # A reschedule frees the slot it was moved away from as well
+    previous = getattr(instance, '_loaded_scheduled_time', None)
+    if previous and previous != instance.scheduled_time:
+        bookings.append((instance.doctor_id, previous))
+    instance._loaded_scheduled_time = instance.scheduled_time
+    # Bookings save inside a transaction; see invalidate_slots_on_commit()
+    invalidate_slots_on_commit(bookings, using=using)
+
+
+@receiver(appointment_status_changed, sender=Appointment)
+def invalidate_availability_after_transition(sender, queryset, bookings, **kwargs):
+    # Confirming keeps the slot taken, so only cancelling or completing lists any
+    if bookings:
+        invalidate_slots_on_commit(bookings, using=queryset.db)
+
+
+@receiver(appointment_status_changed, sender=Appointment)
+def enqueue_status_change(sender, queryset, action, target, by, changed_at, appointment_ids, **kwargs):
+    if appointment_ids is None:
+        # The rows this UPDATE touched are the ones it stamped
+        appointment_ids = list(queryset.filter(status=target, updated_at=changed_at).values_list('pk', flat=True))
+    outbox.enqueue('appointment.status_changed', {
+        'action': action,
+        'status': target,
+        'appointment_ids': appointment_ids,
+        'by': by.pk if by else None,
+    })
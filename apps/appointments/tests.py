@@ -1,9 +1,29 @@
+import json
+import os
+import tempfile
+import uuid
+from io import StringIO
+from unittest import mock
 from django.test import TestCase, Client
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 from django.contrib.auth import get_user_model
-from .models import Appointment
+from apps.core.models import OutboxMessage
+from apps.core.testing import QueryBudgetMixin
+from apps.records.models import MedicalRecord
+from apps.records.search import search_records
+from .archive import ARCHIVE_MIN_AGE, archive_appointments, history_page
+from .models import Appointment, ArchivedAppointment, BOOKING_WINDOW
+from .services import get_doctor_agenda
+from .availability import _cache_key, free_slots, slots_per_day
+from .ical import calendar_token, fold
 
 User = get_user_model()
 
@@ -63,6 +83,63 @@ class AppointmentTests(TestCase):
         self.assertTrue('scheduled_time' in form.errors)
         self.assertTrue("This time slot is already booked" in str(form.errors['scheduled_time']))
 
+    def test_booking_enqueues_outbox_message(self):
+        """A booking commits its outbox row; a rejected one leaves none"""
+        self.client.login(email=self.patient.email, password='pw')
+        data = {
+            'doctor': self.doctor.pk,
+            'scheduled_time': self.future_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'reason_for_visit': 'Checkup'
+        }
+        self.client.post(reverse('book_appointment'), data)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, 'appointment.booked')
+        self.assertEqual(message.payload['appointment_id'], str(Appointment.objects.get().pk))
+        self.client.login(email=self.other_patient.email, password='pw')
+        response = self.client.post(reverse('book_appointment'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_other_integrity_errors_are_not_reported_as_taken_slots(self):
+        """Only the slot constraint turns into a form error; anything else propagates"""
+        self.client.login(email=self.patient.email, password='pw')
+        data = {
+            'doctor': self.doctor.pk,
+            'scheduled_time': self.future_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'reason_for_visit': 'Checkup'
+        }
+        with mock.patch('apps.appointments.views.outbox.enqueue', side_effect=IntegrityError('outbox')):
+            with self.assertRaisesMessage(IntegrityError, 'outbox'):
+                self.client.post(reverse('book_appointment'), data)
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_booking_is_single_insert(self):
+        """Booking runs no pre-check query for the slot; the INSERT enforces it"""
+        self.client.login(email=self.patient.email, password='pw')
+        data = {
+            'doctor': self.doctor.pk,
+            'scheduled_time': self.future_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'reason_for_visit': 'Checkup'
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('book_appointment'), data)
+        self.assertEqual(response.status_code, 302)
+        slot_checks = [q for q in queries if q['sql'].startswith('SELECT') and 'appointments_appointment' in q['sql']]
+        self.assertEqual(slot_checks, [])
+
+    def test_double_booking_constraint(self):
+        """The database rejects a second active booking for the same slot"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_PENDING)
+        # A cancelled booking does not hold the slot
+        Appointment.objects.create(patient=self.other_patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_CANCELLED)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.other_patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_CONFIRMED)
+
+        # Model validation (used by the admin) reports it as a normal error
+        duplicate = Appointment(patient=self.other_patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_PENDING, reason_for_visit='Dup')
+        with self.assertRaisesMessage(ValidationError, 'This time slot is already booked.'):
+            duplicate.full_clean()
+
     def test_past_date_prevention(self):
         """Test rejection of past dates"""
         self.client.login(email=self.patient.email, password='pw')
@@ -97,6 +174,34 @@ class AppointmentTests(TestCase):
         self.assertEqual(appt.status, Appointment.STATUS_CONFIRMED)
         self.assertRedirects(response, reverse('doctor_dashboard'))
 
+    def test_doctor_action_is_single_update(self):
+        """A status change is one conditional UPDATE plus its outbox row"""
+        appt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_CONFIRMED)
+        self.client.login(email=self.doctor.email, password='pw')
+        url = reverse('appointment_action', args=[appt.pk, 'cancel'])
+        # Warm the cached session and user so only the UPDATE, the lookup of the
+        # slot it freed, and the outbox INSERT are left
+        self.client.get(reverse('doctor_dashboard'))
+        with self.assertNumQueries(3):
+            response = self.client.post(url)
+        self.assertRedirects(response, reverse('doctor_dashboard'), fetch_redirect_response=False)
+        appt.refresh_from_db()
+        self.assertEqual(appt.status, Appointment.STATUS_CANCELLED)
+        self.assertEqual(appt.cancelled_by, self.doctor)
+        self.assertEqual(appt.cancellation_reason, "Cancelled by doctor")
+
+    def test_doctor_action_stale_status_is_noop(self):
+        """A transition that no longer applies leaves the row untouched"""
+        appt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.future_time, status=Appointment.STATUS_CANCELLED)
+        self.client.login(email=self.doctor.email, password='pw')
+        response = self.client.post(reverse('appointment_action', args=[appt.pk, 'complete']))
+        self.assertRedirects(response, reverse('doctor_dashboard'))
+        appt.refresh_from_db()
+        self.assertEqual(appt.status, Appointment.STATUS_CANCELLED)
+
+        missing = reverse('appointment_action', args=[uuid.uuid4(), 'confirm'])
+        self.assertEqual(self.client.post(missing).status_code, 404)
+
     def test_doctor_action_invalid_access(self):
         """Test doctor cannot act on another doctor's appointment"""
         other_doc = User.objects.create_user(email='doc2@test.com', password='pw', role='doctor')
@@ -114,3 +219,480 @@ class AppointmentTests(TestCase):
         
         # Should be forbidden
         self.assertEqual(response.status_code, 403)
+
+class BookingQueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = {
+        # Doctor choices on GET; on POST the doctor lookup, the INSERT and its
+        # outbox row in a savepoint, and the cold user snapshot
+        'book_appointment': 6,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        self.client.login(email=self.patient.email, password='pw')
+
+    def test_booking_flow_within_budget(self):
+        self.assertWithinBudget(self.client.get(reverse('book_appointment')))
+        when = (timezone.now() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+        response = self.client.post(reverse('book_appointment'), {
+            'doctor': self.doctor.pk,
+            'scheduled_time': when.strftime('%Y-%m-%d %H:%M:%S'),
+            'reason_for_visit': 'Checkup',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinBudget(response)
+
+class DoctorAgendaTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def make(self, status, offset):
+        return Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.now + offset, status=status)
+
+    def test_agenda_partitions_in_one_query(self):
+        """Agenda buckets match the dashboard rules and cost a single query"""
+        today = self.make(Appointment.STATUS_CONFIRMED, timedelta(hours=1))
+        upcoming = self.make(Appointment.STATUS_CONFIRMED, timedelta(days=2))
+        pending = self.make(Appointment.STATUS_PENDING, timedelta(days=1))
+        self.make(Appointment.STATUS_PENDING, -timedelta(hours=1)) # Stale request
+        self.make(Appointment.STATUS_CANCELLED, timedelta(days=1))
+        self.make(Appointment.STATUS_CONFIRMED, -timedelta(days=1)) # Never completed
+        self.make(Appointment.STATUS_COMPLETED, -timedelta(hours=1)) # Paged separately
+
+        with self.assertNumQueries(1):
+            agenda = get_doctor_agenda(self.doctor, now=self.now)
+            self.assertEqual(agenda.today, [today])
+            self.assertEqual(agenda.upcoming, [upcoming])
+            self.assertEqual(agenda.pending, [pending])
+            self.assertEqual(agenda.today[0].patient.last_name, 'Test')
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='Pat', last_name='Smith')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        start = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        self.confirmed = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=start + timedelta(hours=i), status=Appointment.STATUS_CONFIRMED, reason_for_visit=f'Visit {i}; follow-up')
+            for i in range(3)
+        ]
+        self.pending = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=start + timedelta(hours=5), status=Appointment.STATUS_PENDING)
+        self.url = reverse('doctor_calendar_feed', args=[calendar_token(self.doctor)])
+
+    def test_feed_lists_confirmed_appointments(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertNotIn(str(self.pending.pk), body)
+        self.assertIn('SUMMARY:Appointment: Pat Smith', body)
+        self.assertIn('DESCRIPTION:Visit 0\\; follow-up', body)
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+
+    def test_unchanged_feed_is_304_from_two_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        # The change stamp, and the patients whose names the feed shows
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_renders_only_changed_event(self):
+        etag = self.client.get(self.url)['ETag']
+        Appointment.objects.filter(pk=self.pending.pk).transition('confirm')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.content.decode().count('BEGIN:VEVENT'), 4)
+        # ETag and its patients, event stamps, then one row load for the newly confirmed appointment
+        self.assertEqual(len(queries), 4)
+        self.assertIn(str(self.pending.pk).replace('-', ''), queries[3]['sql'])
+
+    def test_feed_follows_renames(self):
+        """Event summaries show the patient's name and the calendar name the doctor's"""
+        etag = self.client.get(self.url)['ETag']
+        self.patient.last_name = 'Jones'
+        self.patient.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode().count('SUMMARY:Appointment: Pat Jones'), 3)
+        etag = response['ETag']
+        self.doctor.last_name = 'Renamed'
+        self.doctor.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-WR-CALNAME:Dr. Renamed - Appointments', response.content.decode())
+
+    def test_bad_or_revoked_token_is_404(self):
+        self.assertEqual(self.client.get(reverse('doctor_calendar_feed', args=['1-nope'])).status_code, 404)
+        self.doctor.set_password('new-pw')
+        self.doctor.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_long_lines_are_folded(self):
+        folded = fold('DESCRIPTION:' + 'é' * 60)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', ''), 'DESCRIPTION:' + 'é' * 60)
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.ten_am = timezone.make_aware(datetime.combine(self.day, time(10)))
+
+    def test_free_slots_exclude_active_bookings(self):
+        """Pending and confirmed bookings take a slot, cancelled ones do not"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.ten_am, status=Appointment.STATUS_PENDING)
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.ten_am + timedelta(hours=1), status=Appointment.STATUS_CANCELLED)
+
+        with self.assertNumQueries(1):
+            slots = free_slots(self.doctor.pk, self.day, self.day)
+        self.assertNotIn(self.ten_am, slots)
+        self.assertIn(self.ten_am + timedelta(hours=1), slots)
+        self.assertEqual(len(slots), slots_per_day() - 1)
+
+        # Served from the cached bitmap the second time
+        with self.assertNumQueries(0):
+            free_slots(self.doctor.pk, self.day, self.day)
+
+    def test_saving_appointment_invalidates_day(self):
+        """Booking a slot removes it from the next availability answer"""
+        self.assertIn(self.ten_am, free_slots(self.doctor.pk, self.day, self.day))
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.ten_am, status=Appointment.STATUS_PENDING)
+        self.assertNotIn(self.ten_am, free_slots(self.doctor.pk, self.day, self.day))
+
+    def test_bitmap_read_before_commit_is_dropped(self):
+        """A bitmap cached between the booking's save and its commit doesn't outlive the commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.ten_am, status=Appointment.STATUS_PENDING)
+            # Stands in for a request that read the day before the booking committed
+            cache.set(_cache_key(self.doctor.pk, self.day), 0)
+            self.assertIn(self.ten_am, free_slots(self.doctor.pk, self.day, self.day))
+        for callback in callbacks:
+            callback()
+        self.assertNotIn(self.ten_am, free_slots(self.doctor.pk, self.day, self.day))
+
+    def test_availability_endpoint(self):
+        """Endpoint lists free slots as ISO datetimes"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.ten_am, status=Appointment.STATUS_CONFIRMED)
+        self.client.login(email=self.patient.email, password='pw')
+        url = reverse('doctor_availability', args=[self.doctor.pk])
+        response = self.client.get(url, {'start': self.day.isoformat(), 'end': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        slots = response.json()['slots']
+        self.assertNotIn(self.ten_am.isoformat(), slots)
+        self.assertIn((self.ten_am + timedelta(minutes=30)).isoformat(), slots)
+
+        response = self.client.get(reverse('doctor_availability', args=[self.patient.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_availability_endpoint_stays_in_the_booking_window(self):
+        """Dates far outside the booking window give no slots rather than an error"""
+        self.client.login(email=self.patient.email, password='pw')
+        url = reverse('doctor_availability', args=[self.doctor.pk])
+        for params in ({'start': '9999-12-31'}, {'start': '9999-12-25', 'end': '9999-12-31'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['slots'], [])
+        last_day = timezone.localdate() + BOOKING_WINDOW
+        slots = self.client.get(url, {'start': last_day.isoformat(), 'end': '9999-12-31'}).json()['slots']
+        self.assertEqual({date.fromisoformat(slot[:10]) for slot in slots}, {last_day})
+
+class ImportAppointmentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+        self.slot = (timezone.now() + timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_import_csv_with_rejects(self):
+        """Valid rows are bulk inserted; bad rows and clashes go to the reject file"""
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=self.slot, status=Appointment.STATUS_CONFIRMED)
+        later = self.slot + timedelta(hours=1)
+        path = self.write('in.csv', '\n'.join([
+            'doctor_email,patient_email,scheduled_time,reason_for_visit,status',
+            f'doc@test.com,pat@test.com,{later.isoformat()},Checkup,',
+            f'doc@test.com,pat@test.com,{later.isoformat()},Duplicate in file,CONFIRMED',
+            f'doc@test.com,pat@test.com,{self.slot.isoformat()},Clash with existing,',
+            f'nobody@test.com,pat@test.com,{later.isoformat()},Unknown doctor,',
+            f'doc@test.com,pat@test.com,{self.slot.isoformat()},Old visit,COMPLETED',
+            'doc@test.com,pat@test.com,yesterday,Bad time,',
+        ]) + '\n')
+        rejects = os.path.join(self.tmpdir.name, 'rejects.ndjson')
+
+        call_command('import_appointments', path, reject_file=rejects, chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(Appointment.objects.count(), 3)
+        self.assertTrue(Appointment.objects.filter(reason_for_visit='Checkup', status=Appointment.STATUS_PENDING).exists())
+        self.assertTrue(Appointment.objects.filter(reason_for_visit='Old visit').exists())
+        with open(rejects) as f:
+            rejected = sorted((r['line'], r['reason']) for r in map(json.loads, f))
+        self.assertEqual(rejected, [
+            (3, 'Time slot already booked.'),
+            (4, 'Time slot already booked.'),
+            (5, 'Unknown doctor.'),
+            (7, 'Invalid scheduled_time.'),
+        ])
+
+    def test_import_ndjson(self):
+        """NDJSON input is read line by line"""
+        path = self.write('in.ndjson', json.dumps({
+            'doctor_email': 'doc@test.com', 'patient_email': 'pat@test.com',
+            'scheduled_time': self.slot.isoformat(), 'reason_for_visit': 'Checkup',
+        }) + '\nnot json\n')
+        call_command('import_appointments', path, stdout=StringIO())
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 1)
+
+    def test_import_ndjson_rejects_rows_that_are_not_text_fields(self):
+        """Valid JSON of the wrong shape is rejected instead of crashing the import"""
+        row = {'doctor_email': 'doc@test.com', 'patient_email': 'pat@test.com', 'scheduled_time': self.slot.isoformat()}
+        path = self.write('in.ndjson', '\n'.join(map(json.dumps, [
+            [1, 2],
+            {**row, 'scheduled_time': 20260101},
+            {**row, 'reason_for_visit': None, 'notes': 3},
+        ])) + '\n')
+        rejects = os.path.join(self.tmpdir.name, 'rejects.ndjson')
+        call_command('import_appointments', path, reject_file=rejects, stdout=StringIO())
+        self.assertEqual(Appointment.objects.get().reason_for_visit, '')
+        with open(rejects) as f:
+            rejected = [(r['line'], r['reason']) for r in map(json.loads, f)]
+        self.assertEqual(rejected, [(1, 'Expected a JSON object.'), (2, 'Expected text for scheduled_time.')])
+
+    def test_bad_options_and_paths_are_command_errors(self):
+        path = self.write('in.csv', 'doctor_email,patient_email,scheduled_time\n')
+        missing_dir = os.path.join(self.tmpdir.name, 'missing', 'rejects.ndjson')
+        for args, options in (
+            ([path], {'chunk_size': 0}),
+            ([os.path.join(self.tmpdir.name, 'missing.csv')], {}),
+            ([path], {'reject_file': missing_dir}),
+        ):
+            with self.assertRaises(CommandError):
+                call_command('import_appointments', *args, stdout=StringIO(), **options)
+
+class BulkActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+        self.other_doctor = User.objects.create_user(email='doc2@test.com', password='pw', role='doctor')
+        self.start = (timezone.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def make(self, status, hours, doctor=None):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, scheduled_time=self.start + timedelta(hours=hours), status=status)
+
+    def test_bulk_confirm_respects_ownership_and_state(self):
+        """Only the doctor's own pending appointments are confirmed"""
+        pending = [self.make(Appointment.STATUS_PENDING, i) for i in range(3)]
+        cancelled = self.make(Appointment.STATUS_CANCELLED, 4)
+        foreign = self.make(Appointment.STATUS_PENDING, 5, doctor=self.other_doctor)
+
+        self.client.login(email=self.doctor.email, password='pw')
+        ids = [a.pk for a in pending + [cancelled, foreign]]
+        response = self.client.post(reverse('bulk_appointment_action', args=['confirm']), {'appointment_ids': ids}, follow=True)
+
+        self.assertContains(response, '3 of 5 appointment(s) updated.')
+        self.assertEqual(Appointment.objects.filter(status=Appointment.STATUS_CONFIRMED).count(), 3)
+        cancelled.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual(cancelled.status, Appointment.STATUS_CANCELLED)
+        self.assertEqual(foreign.status, Appointment.STATUS_PENDING)
+
+    def test_transition_is_single_update(self):
+        """transition() changes many rows with one statement"""
+        for i in range(5):
+            self.make(Appointment.STATUS_CONFIRMED, i)
+        with CaptureQueriesContext(connection) as queries:
+            updated = Appointment.objects.filter(doctor=self.doctor).transition(
+                'cancel', by=self.doctor, reason='Clinic closed'
+            )
+        self.assertEqual(updated, 5)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertFalse(Appointment.objects.exclude(cancelled_by=self.doctor).exists())
+
+    def test_transition_enqueues_changed_rows(self):
+        """The outbox message names only the appointments this transition changed"""
+        pending = self.make(Appointment.STATUS_PENDING, 0)
+        self.make(Appointment.STATUS_CONFIRMED, 1)
+        Appointment.objects.filter(doctor=self.doctor).transition('confirm', by=self.doctor)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, 'appointment.status_changed')
+        self.assertEqual(message.payload['appointment_ids'], [str(pending.pk)])
+        self.assertEqual(message.payload['by'], self.doctor.pk)
+        # Nothing changed, nothing enqueued
+        Appointment.objects.filter(doctor=self.doctor).transition('confirm', by=self.doctor)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_bulk_cancel_frees_availability(self):
+        """Cancelled slots become bookable again"""
+        appt = self.make(Appointment.STATUS_PENDING, 0)
+        day = timezone.localdate(appt.scheduled_time)
+        # Keep the slot inside opening hours whatever time the test runs
+        with self.settings(CLINIC_OPENING_HOUR=0, CLINIC_CLOSING_HOUR=24):
+            self.assertNotIn(appt.scheduled_time, free_slots(self.doctor.pk, day, day))
+            Appointment.objects.filter(pk=appt.pk).transition('cancel')
+            self.assertIn(appt.scheduled_time, free_slots(self.doctor.pk, day, day))
+
+    def test_cancel_drops_only_its_day_after_commit(self):
+        """A cancellation drops the freed slot's day again once it commits, and no other day"""
+        appt = self.make(Appointment.STATUS_PENDING, 0)
+        day = timezone.localdate(appt.scheduled_time)
+        other_day = day + timedelta(days=1)
+        free_slots(self.doctor.pk, other_day, other_day)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Appointment.objects.filter(pk=appt.pk).transition('cancel')
+            # Stands in for a request that read the day before the cancellation committed
+            cache.set(_cache_key(self.doctor.pk, day), 0)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(_cache_key(self.doctor.pk, day)))
+        self.assertIsNotNone(cache.get(_cache_key(self.doctor.pk, other_day)))
+
+    def test_admin_bulk_actions(self):
+        """Admin actions apply the same transitions"""
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='pw', role='admin')
+        pending = self.make(Appointment.STATUS_PENDING, 0)
+        confirmed = self.make(Appointment.STATUS_CONFIRMED, 1, doctor=self.other_doctor)
+        self.client.login(email=admin_user.email, password='pw')
+        response = self.client.post(reverse('admin:appointments_appointment_changelist'), {
+            'action': 'complete_selected',
+            '_selected_action': [pending.pk, confirmed.pk],
+        }, follow=True)
+        self.assertContains(response, '1 appointment(s) updated.')
+        pending.refresh_from_db()
+        confirmed.refresh_from_db()
+        self.assertEqual(pending.status, Appointment.STATUS_PENDING)
+        self.assertEqual(confirmed.status, Appointment.STATUS_COMPLETED)
+
+class AppointmentExportTests(TestCase):
+    def test_patient_appointment_export(self):
+        """Patients stream their own appointment history"""
+        patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient')
+        doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='House')
+        Appointment.objects.create(patient=patient, doctor=doctor, scheduled_time=timezone.now(), status=Appointment.STATUS_COMPLETED, reason_for_visit='Checkup')
+        client = Client()
+        client.login(email=patient.email, password='pw')
+        response = client.get(reverse('patient_appointment_export', args=['ndjson']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['doctor_last_name'], 'House')
+        self.assertEqual(rows[0]['status'], Appointment.STATUS_COMPLETED)
+
+class ArchiveAppointmentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='House')
+        now = timezone.now()
+        self.old = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now - timedelta(days=400 + i), status=status)
+            for i, status in enumerate([Appointment.STATUS_COMPLETED, Appointment.STATUS_CANCELLED, Appointment.STATUS_COMPLETED])
+        ]
+        self.record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=self.old[0], diagnosis='Migraine', notes='Dark room')
+        self.recent = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now - timedelta(days=5), status=Appointment.STATUS_COMPLETED)
+        # Never confirmed nor cancelled: not finished, so it stays
+        self.stale = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now - timedelta(days=500), status=Appointment.STATUS_PENDING)
+
+    def archive(self, **options):
+        call_command('archive_appointments', batch_size=2, stdout=StringIO(), **options)
+
+    def test_moves_old_finished_appointments_with_their_records(self):
+        self.archive()
+        self.assertEqual(set(Appointment.objects.values_list('pk', flat=True)), {self.recent.pk, self.stale.pk})
+        self.assertEqual(set(ArchivedAppointment.objects.values_list('pk', flat=True)), {appt.pk for appt in self.old})
+        archived = ArchivedAppointment.objects.get(pk=self.old[1].pk)
+        self.assertEqual((archived.status, archived.updated_at), (self.old[1].status, self.old[1].updated_at))
+
+        record = MedicalRecord.objects.get(pk=self.record.pk)
+        self.assertIsNone(record.appointment_id)
+        self.assertEqual(record.archived_appointment.medical_record, record)
+        # The table rebuild in the migration kept full-text search working
+        self.assertEqual(list(search_records(MedicalRecord.objects.all(), 'migraine')), [record])
+
+        # Running again finds nothing left to move
+        self.archive()
+        self.assertEqual(ArchivedAppointment.objects.count(), 3)
+
+    def test_batch_is_bulk_statements_without_signals(self):
+        """A batch costs a fixed number of statements and no per-row cache calls"""
+        before = timezone.now() - ARCHIVE_MIN_AGE
+        with mock.patch('apps.appointments.availability.cache', wraps=cache) as availability_cache:
+            # Savepoint, locked ids, the rows to copy, the INSERT, the record
+            # UPDATE, the DELETE, release
+            with self.assertNumQueries(7):
+                self.assertEqual(next(archive_appointments(before, batch_size=10)), 3)
+        self.assertEqual(availability_cache.mock_calls, [])
+        self.assertEqual(ArchivedAppointment.objects.count(), 3)
+
+    def test_refuses_thresholds_inside_the_agenda(self):
+        with self.assertRaises(CommandError):
+            self.archive(older_than=7)
+
+    def test_history_pages_read_both_tables_in_order(self):
+        expected = list(
+            Appointment.objects.filter(status__in=Appointment.FINISHED_STATUSES).order_by('-scheduled_time', '-pk').values_list('pk', flat=True)
+        )
+        self.archive()
+        live = Appointment.objects.filter(patient=self.patient, status__in=Appointment.FINISHED_STATUSES)
+        archived = ArchivedAppointment.objects.filter(patient=self.patient)
+        seen, cursor = [], None
+        while True:
+            page = history_page(live, archived, cursor, per_page=2)
+            seen.extend(appt.pk for appt in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_history_sees_batches_archived_elsewhere(self):
+        """The archive horizon isn't remembered between pages, e.g. from before another process archived"""
+        live = Appointment.objects.filter(patient=self.patient, status__in=Appointment.FINISHED_STATUSES)
+        archived = ArchivedAppointment.objects.filter(patient=self.patient)
+        self.assertEqual([appt.pk for appt in history_page(live, archived, per_page=1)], [self.recent.pk])
+        # Moved as a batch of the command would, without anything in this process noticing
+        moved = Appointment.objects.filter(pk__in=[self.old[1].pk, self.old[2].pk])
+        fields = [field.attname for field in Appointment._meta.concrete_fields]
+        ArchivedAppointment.objects.bulk_create(ArchivedAppointment(**values) for values in moved.values(*fields))
+        moved.delete()
+        seen, cursor = [], None
+        while cursor or not seen:
+            page = history_page(live, archived, cursor, per_page=1)
+            seen.extend(appt.pk for appt in page)
+            cursor = page.next_cursor
+        self.assertEqual(seen, [self.recent.pk] + [appt.pk for appt in self.old])
+
+    def test_archived_appointments_stay_visible(self):
+        self.archive()
+        client = Client()
+        client.login(email=self.patient.email, password='pw')
+        response = client.get(reverse('patient_dashboard'))
+        self.assertContains(response, 'Cancelled')
+
+        response = client.get(reverse('api_appointments'), {'fields': 'id,medical_record_id'})
+        rows = {row['id']: row['medical_record_id'] for row in response.json()['results']}
+        self.assertEqual(rows[str(self.old[0].pk)], str(self.record.pk))
+        self.assertEqual(len(rows), 5)
+        response = client.get(reverse('api_appointment', args=[self.old[1].pk]))
+        self.assertEqual(response.json()['status'], Appointment.STATUS_CANCELLED)
+        response = client.get(reverse('api_record', args=[self.record.pk]), {'fields': 'appointment_id'})
+        self.assertEqual(response.json(), {'appointment_id': str(self.old[0].pk)})
+
+        response = client.get(reverse('patient_appointment_export', args=['ndjson']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
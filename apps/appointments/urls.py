@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path('book/', views.BookAppointmentView.as_view(), name='book_appointment'),
+    path('availability/<int:doctor_id>/', views.DoctorAvailabilityView.as_view(), name='doctor_availability'),
+    path('calendar/<str:token>.ics', views.DoctorCalendarFeedView.as_view(), name='doctor_calendar_feed'),
+    path('export/all/<str:fmt>/', views.AdminAppointmentExportView.as_view(), name='admin_appointment_export'),
+    path('export/<str:fmt>/', views.PatientAppointmentExportView.as_view(), name='patient_appointment_export'),
+    path('bulk/<str:action>/', views.BulkAppointmentActionView.as_view(), name='bulk_appointment_action'),
     path('<uuid:pk>/<str:action>/', views.AppointmentActionView.as_view(), name='appointment_action'),
 ]
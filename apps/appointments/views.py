@@ -1,7 +1,10 @@
+from django.db import IntegrityError, transaction
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
-from apps.core.mixins import PatientRequiredMixin
-from .models import Appointment
+from apps.core import outbox
+from apps.core.exports import StreamingExportView
+from apps.core.mixins import PatientRequiredMixin, AdminRequiredMixin
+from .models import Appointment, ArchivedAppointment, BOOKING_WINDOW
 from .forms import AppointmentBookingForm
 
 class BookAppointmentView(PatientRequiredMixin, CreateView):
@@ -18,34 +21,170 @@ class BookAppointmentView(PatientRequiredMixin, CreateView):
     def form_valid(self, form):
         # Patient is already set in form __init__
         form.instance.status = Appointment.STATUS_PENDING
-        return super().form_valid(form)
+        # The INSERT itself is the double-booking check: the unique_active_doctor_slot
+        # constraint rejects it if the slot was taken, including by a concurrent request
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+                # Notifications etc. run in the outbox worker, committed with the booking
+                outbox.enqueue('appointment.booked', {
+                    'appointment_id': self.object.pk,
+                    'patient_id': self.object.patient_id,
+                    'doctor_id': self.object.doctor_id,
+                    'scheduled_time': self.object.scheduled_time,
+                })
+                return response
+        except IntegrityError:
+            # Only a clash on unique_active_doctor_slot means the slot was taken. Not
+            # every backend names the constraint, so look at the slot itself
+            taken = Appointment.objects.filter(
+                doctor_id=form.instance.doctor_id,
+                scheduled_time=form.instance.scheduled_time,
+                status__in=Appointment.ACTIVE_STATUSES,
+            ).exists()
+            if not taken:
+                raise
+            form.add_slot_taken_error()
+            return self.form_invalid(form)
 
+import uuid
 from django.views import View
+from django.contrib import messages
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.core.exceptions import PermissionDenied
 from apps.core.mixins import DoctorRequiredMixin
 
 class AppointmentActionView(DoctorRequiredMixin, View):
     def post(self, request, pk, action):
-        appointment = get_object_or_404(Appointment, pk=pk)
-        
+        if action in Appointment.TRANSITIONS:
+            # Compare-and-swap: ownership and the allowed source statuses are part of the
+            # UPDATE's WHERE clause, so concurrent clicks cannot overwrite each other
+            updated = Appointment.objects.filter(pk=pk, doctor=request.user).transition(
+                action, by=request.user, reason="Cancelled by doctor", appointment_ids=[pk]
+            )
+            if updated:
+                return redirect('doctor_dashboard')
+
+        # Nothing changed - only now look the appointment up to report why
+        appointment = get_object_or_404(Appointment.objects.only('patient', 'doctor'), pk=pk)
+
         # Verify Ownership
         if not appointment.is_accessible_by(request.user):
             raise PermissionDenied
-            
-        if action == 'confirm':
-            if appointment.status == Appointment.STATUS_PENDING:
-                appointment.status = Appointment.STATUS_CONFIRMED
-                appointment.save()
-        elif action == 'cancel':
-            if appointment.can_be_cancelled():
-                appointment.status = Appointment.STATUS_CANCELLED
-                appointment.cancelled_by = request.user
-                appointment.cancellation_reason = "Cancelled by doctor"
-                appointment.save()
-        elif action == 'complete':
-            if appointment.can_be_completed():
-                appointment.status = Appointment.STATUS_COMPLETED
-                appointment.save()
-        
+
+        # Already moved on (e.g. confirmed by another click) - nothing to do
+        return redirect('doctor_dashboard')
+
+class BulkAppointmentActionView(DoctorRequiredMixin, View):
+    """Apply one action to every selected appointment with a single UPDATE."""
+    def post(self, request, action):
+        if action not in Appointment.TRANSITIONS:
+            raise Http404("Unknown action.")
+
+        ids = []
+        for value in request.POST.getlist('appointment_ids'):
+            try:
+                ids.append(uuid.UUID(value))
+            except ValueError:
+                continue
+
+        # Ownership is part of the WHERE clause; the state machine is applied by transition()
+        updated = Appointment.objects.filter(doctor=request.user, pk__in=ids).transition(
+            action, by=request.user, reason="Cancelled by doctor"
+        )
+        messages.success(request, f"{updated} of {len(ids)} appointment(s) updated.")
         return redirect('doctor_dashboard')
+
+from datetime import date, timedelta
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.utils import timezone
+from apps.accounts.models import User
+from .availability import free_slots, slot_minutes
+
+class DoctorAvailabilityView(LoginRequiredMixin, View):
+    """Free slots for a doctor between ?start= and ?end= (ISO dates, inclusive)."""
+    max_days = 31
+
+    def get(self, request, doctor_id):
+        doctor = get_object_or_404(User, pk=doctor_id, role='doctor')
+        today = timezone.localdate()
+        last_day = today + BOOKING_WINDOW
+        try:
+            start = date.fromisoformat(request.GET.get('start', today.isoformat()))
+            end = date.fromisoformat(request.GET['end']) if 'end' in request.GET else None
+        except ValueError:
+            return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates.'}, status=400)
+
+        # Nothing outside the booking window can be booked anyway. Clamped before
+        # any arithmetic, so dates like 9999-12-31 can't overflow; a start past the
+        # window becomes the day after it, which leaves nothing to list.
+        start = min(max(start, today), last_day + timedelta(days=1))
+        if end is None:
+            end = start + timedelta(days=6)
+        end = min(end, last_day, start + timedelta(days=self.max_days - 1))
+        slots = free_slots(doctor.pk, start, end) if start <= end else []
+        return JsonResponse({
+            'doctor': doctor.pk,
+            'slot_minutes': slot_minutes(),
+            'slots': [slot.isoformat() for slot in slots],
+        })
+
+
+APPOINTMENT_EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('scheduled_time', 'scheduled_time'),
+    ('status', 'status'),
+    ('patient_email', 'patient__email'),
+    ('doctor_email', 'doctor__email'),
+    ('doctor_last_name', 'doctor__last_name'),
+    ('reason_for_visit', 'reason_for_visit'),
+    ('cancellation_reason', 'cancellation_reason'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+
+class PatientAppointmentExportView(PatientRequiredMixin, StreamingExportView):
+    columns = APPOINTMENT_EXPORT_COLUMNS
+    filename = 'appointments'
+
+    def get_queryset(self):
+        return Appointment.objects.filter(patient=self.request.user).order_by('scheduled_time')
+
+    def get_archived_queryset(self):
+        return ArchivedAppointment.objects.filter(patient=self.request.user).order_by('scheduled_time')
+
+class AdminAppointmentExportView(AdminRequiredMixin, StreamingExportView):
+    columns = APPOINTMENT_EXPORT_COLUMNS
+    filename = 'all-appointments'
+
+    def get_queryset(self):
+        # Primary key order streams straight off the index without a sort
+        return Appointment.objects.order_by('pk')
+
+    def get_archived_queryset(self):
+        return ArchivedAppointment.objects.order_by('pk')
+
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from . import ical
+
+class DoctorCalendarFeedView(View):
+    """Token-addressed .ics feed of a doctor's confirmed appointments, for calendar clients."""
+    def get(self, request, token):
+        doctor = ical.doctor_for_token(token)
+        if doctor is None:
+            raise Http404("Unknown calendar feed.")
+
+        # Most polls stop here: the ETag comes from the (doctor, updated_at) index,
+        # the feed's patient ids and cached user versions
+        etag = f'"{ical.feed_etag(doctor.pk)}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(ical.cached_feed(doctor, etag), content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=60)
+        return response
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'apps.core'
+
+    def ready(self):
+        # Hooks the query recorder onto every new database connection
+        from . import middleware  # noqa: F401
@@ -0,0 +1,44 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+
+def _run_on_own_connection(query):
+    # Worker threads keep their connection between calls, so apply the same
+    # max-age/health rules Django applies around requests
+    close_old_connections()
+    try:
+        return query()
+    finally:
+        close_old_connections()
+
+
+def _run_if_connection_is_shared(queries):
+    """
+    Run the queries on the request's connection when other connections can't be used.
+
+    SQLite serializes writers anyway, and inside a transaction other connections
+    can't see its uncommitted rows. Returns None when concurrency is safe.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'sqlite' or connection.in_atomic_block:
+        return {name: query() for name, query in queries.items()}
+    return None
+
+
+async def run_concurrently(queries):
+    """
+    Evaluate {name: callable} pieces of independent ORM work and return {name: result}.
+
+    Each callable runs in its own thread on its own database connection, so the
+    database answers them in parallel and the wait is the slowest query rather
+    than the sum. Callables must force their querysets (list(), paginate_keyset).
+    """
+    results = await sync_to_async(_run_if_connection_is_shared)(queries)
+    if results is not None:
+        return results
+    values = await asyncio.gather(*(
+        sync_to_async(_run_on_own_connection, thread_sensitive=False)(query)
+        for query in queries.values()
+    ))
+    return dict(zip(queries, values))
@@ -0,0 +1,108 @@
+"""
+Conditional GET (ETag / Last-Modified) for pages rendered per user.
+
+A view supplies validators from a couple of cheap queries, change_stamp() over
+its own rows and counterpart_versions() for the users they name, and answers
+304 before it builds any context when the browser's copy is still current. Besides the
+view's own data, page ETags cover what every page renders: the user (through
+their snapshot version, see counterpart_versions() for other users a page
+names), the CSRF secret the page's forms were rendered with,
+and PAGE_ETAG_SALT, which should change per deploy so new templates aren't
+answered with old pages.
+"""
+import hashlib
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db import connections
+from django.db.models import Count, Max, Value
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from apps.accounts.backends import user_version, user_versions
+
+
+def page_etag(request, *parts):
+    """A strong ETag for the page at this URL, as rendered for request.user, over `parts`."""
+    user = request.user
+    parts = (
+        getattr(settings, 'PAGE_ETAG_SALT', ''), request.get_full_path(),
+        user.pk, user_version(user.pk), request.META.get('CSRF_COOKIE', ''), *parts,
+    )
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def change_stamp(**sources):
+    """
+    Latest timestamp and row count of several querysets, in one query.
+
+    Each source is name=(queryset, timestamp field). The counts catch deletes,
+    which the latest timestamp alone would miss. Values come back raw from the
+    database: they are only hashed, never compared.
+    """
+    selects, params, using = [], [], None
+    for queryset, field in sources.values():
+        using = queryset.db
+        # Grouping by a constant aggregates the whole filtered set into one row
+        grouped = queryset.order_by().annotate(_all=Value(1)).values('_all')
+        for aggregate in (Max(field), Count('pk')):
+            query = grouped.annotate(value=aggregate).values('value').query
+            sql, sql_params = query.get_compiler(using).as_sql()
+            selects.append(f'({sql})')
+            params.extend(sql_params)
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(selects), params)
+        return cursor.fetchone()
+
+
+def counterpart_versions(*querysets):
+    """
+    Versions of the other users a page names, e.g. a patient's doctors, so
+    renaming one of them changes the ETag. Each queryset is a flat
+    values_list() of user ids; their union is read in one query.
+    """
+    first, *rest = [queryset.order_by() for queryset in querysets]
+    user_ids = sorted(set(first.union(*rest)))
+    return user_versions(user_ids)
+
+
+class ConditionalGetMixin:
+    """
+    Answer GET with 304 Not Modified when the client's copy matches get_validators().
+
+    Pages with pending flash messages are always rendered, since the messages
+    are shown (and consumed) by the render.
+    """
+    etag = None
+    last_modified = None
+
+    def get_validators(self):
+        """(etag, last_modified datetime) for the page about to be rendered; either may be None."""
+        return None, None
+
+    def not_modified(self):
+        """Work out the validators; returns the 304 response, or None to render."""
+        if len(get_messages(self.request)):
+            return None
+        self.etag, self.last_modified = self.get_validators()
+        if self.etag is None and self.last_modified is None:
+            return None
+        return get_conditional_response(
+            self.request, etag=self.etag,
+            last_modified=int(self.last_modified.timestamp()) if self.last_modified else None,
+        )
+
+    def add_validators(self, response):
+        if self.etag is None and self.last_modified is None:
+            return response
+        if self.etag:
+            response.headers['ETag'] = self.etag
+        if self.last_modified:
+            response.headers['Last-Modified'] = http_date(self.last_modified.timestamp())
+        # Per-user pages: browsers may keep them, but must check back every time
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.not_modified()
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return self.add_validators(response)
@@ -0,0 +1,225 @@
+"""
+Synthetic clinic data for benchmarks and load tests.
+
+Everything is written in batches: COPY for appointments and records on
+PostgreSQL, bulk_create otherwise. Either way model validation, save() and
+signals are skipped, so cached availability and user snapshots are dropped by
+hand at the end. All passwords share a single hash. Given the same seed and an
+empty database, the generated rows are identical between runs, apart from
+autoincrement user ids and created_at timestamps.
+"""
+import bisect
+import csv
+import io
+import random
+import uuid
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.accounts.backends import invalidate_user_snapshots
+from apps.accounts.models import User
+from apps.appointments.availability import invalidate_doctor, slot_start, slots_per_day
+from apps.appointments.models import Appointment, BOOKING_WINDOW
+from apps.records.models import MedicalRecord
+
+DATASET_PASSWORD = 'clinic-dataset'
+DATASET_EMAIL_DOMAIN = 'dataset.clinic.test'
+
+SPECIALITIES = ['Cardiology', 'Dermatology', 'General Practice', 'Neurology', 'Orthopedics', 'Pediatrics']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Jones', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson', 'Khan', 'Nguyen']
+REASONS = ['Checkup', 'Follow-up', 'Headache', 'Back pain', 'Fever', 'Rash', 'Vaccination', 'Blood test review']
+DIAGNOSES = ['Influenza', 'Migraine', 'Hypertension', 'Type 2 diabetes', 'Asthma', 'Eczema', 'Lumbar strain', 'Bronchitis']
+NOTE_WORDS = [
+    'patient', 'reports', 'mild', 'severe', 'pain', 'fever', 'prescribed', 'rest', 'fluids',
+    'ibuprofen', 'follow-up', 'two', 'weeks', 'blood', 'pressure', 'stable', 'improving', 'referral',
+]
+
+
+class DatasetBuilder:
+    """
+    Generate doctors, patients, appointments and medical records.
+
+    Each patient gets about `appointments_per_patient` appointments, picked
+    uniformly between 0 and twice that number. A `future_ratio` share falls in
+    the booking window and the rest in the last `history_days` days. Past
+    appointments are COMPLETED or CANCELLED. A `record_ratio` share of the
+    completed ones get a medical record. Future active appointments are laid
+    out on each doctor's slot grid in order, so they never collide on the
+    unique active slot constraint.
+
+    `doctor_skew` controls how bookings spread over doctors. 0 spreads them
+    evenly. Higher values follow a Zipf-like curve, so a few doctors get most of
+    the bookings.
+    """
+
+    def __init__(self, doctors=100, patients=1000, appointments_per_patient=10, future_ratio=0.15,
+                 record_ratio=0.6, history_days=365, doctor_skew=0.0, seed=0, batch_size=5000,
+                 email_domain=DATASET_EMAIL_DOMAIN, password=DATASET_PASSWORD, use_copy=True, log=None):
+        self.doctors = doctors
+        self.patients = patients
+        self.appointments_per_patient = appointments_per_patient
+        self.future_ratio = future_ratio
+        self.record_ratio = record_ratio
+        self.history_days = history_days
+        self.doctor_skew = doctor_skew
+        self.batch_size = batch_size
+        self.email_domain = email_domain
+        self.password = password
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.counts = {'doctors': 0, 'patients': 0, 'appointments': 0, 'records': 0}
+
+    def build(self):
+        self.today = timezone.localdate()
+        self.slot_times = {}
+        # One hash for every account instead of one per user
+        self.password_hash = make_password(self.password)
+        doctor_ids = self.create_users('doctor', self.doctors)
+        patient_ids = self.create_users('patient', self.patients)
+
+        # Next free slot on each doctor's grid, counted from opening time today
+        self.next_slot = {doctor_id: self.rng.randrange(slots_per_day()) for doctor_id in doctor_ids}
+        self.window_slots = BOOKING_WINDOW.days * slots_per_day()
+        pick_doctor = self.doctor_picker(doctor_ids)
+
+        appointments, records = [], []
+        for patient_id in patient_ids:
+            for _ in range(self.rng.randint(0, 2 * self.appointments_per_patient)):
+                appointment = self.make_appointment(patient_id, pick_doctor())
+                appointments.append(appointment)
+                if appointment.status == Appointment.STATUS_COMPLETED and self.rng.random() < self.record_ratio:
+                    records.append(self.make_record(appointment))
+            if len(appointments) >= self.batch_size:
+                self.flush(appointments, records)
+                appointments, records = [], []
+        self.flush(appointments, records)
+
+        # bulk_create sent no signals, so nothing cached about these users is current
+        invalidate_user_snapshots(doctor_ids + patient_ids)
+        for doctor_id in doctor_ids:
+            invalidate_doctor(doctor_id)
+        return self.counts
+
+    def doctor_picker(self, doctor_ids):
+        if not self.doctor_skew:
+            return lambda: self.rng.choice(doctor_ids)
+        cumulative, total = [], 0.0
+        for rank in range(len(doctor_ids)):
+            total += 1 / (rank + 1) ** self.doctor_skew
+            cumulative.append(total)
+        return lambda: doctor_ids[bisect.bisect(cumulative, self.rng.random() * total)]
+
+    def create_users(self, role, count):
+        ids = []
+        for start in range(0, count, self.batch_size):
+            batch = [self.make_user(role, i) for i in range(start, min(count, start + self.batch_size))]
+            User.objects.bulk_create(batch)
+            if any(user.pk is None for user in batch):
+                # Backends that can't return ids from a bulk insert
+                by_email = dict(User.objects.filter(email__in=[user.email for user in batch]).values_list('email', 'pk'))
+                ids.extend(by_email[user.email] for user in batch)
+            else:
+                ids.extend(user.pk for user in batch)
+        self.counts[role + 's'] += count
+        self.log(f'Created {count} {role}s')
+        return ids
+
+    def make_user(self, role, i):
+        user = User(
+            email=f'{role}-{i}@{self.email_domain}',
+            password=self.password_hash,
+            role=role,
+            first_name=self.rng.choice(FIRST_NAMES),
+            last_name=self.rng.choice(LAST_NAMES),
+        )
+        if role == 'doctor':
+            user.speciality = self.rng.choice(SPECIALITIES)
+            user.license_number = f'LIC-{self.rng.randrange(10 ** 8):08d}'
+        else:
+            user.phone_number = f'555{self.rng.randrange(10 ** 7):07d}'
+        return user
+
+    def make_appointment(self, patient_id, doctor_id):
+        rng = self.rng
+        appointment = Appointment(
+            id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            reason_for_visit=rng.choice(REASONS),
+        )
+        slot = self.next_slot[doctor_id]
+        if rng.random() < self.future_ratio and slot < self.window_slots:
+            self.next_slot[doctor_id] = slot + rng.randint(1, 3)
+            appointment.scheduled_time = self.slot_time(slot // slots_per_day(), slot % slots_per_day())
+            appointment.status = rng.choices(
+                [Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED, Appointment.STATUS_CANCELLED],
+                weights=[4, 5, 1],
+            )[0]
+        else:
+            appointment.scheduled_time = self.slot_time(-rng.randint(1, self.history_days), rng.randrange(slots_per_day()))
+            appointment.status = rng.choices(
+                [Appointment.STATUS_COMPLETED, Appointment.STATUS_CANCELLED], weights=[4, 1],
+            )[0]
+        if appointment.status == Appointment.STATUS_CANCELLED:
+            appointment.cancelled_by_id = patient_id
+            appointment.cancellation_reason = 'Cancelled by patient'
+        return appointment
+
+    def slot_time(self, day_offset, index):
+        # Memoized: there are only a few thousand distinct slots across the whole range
+        key = (day_offset, index)
+        if key not in self.slot_times:
+            self.slot_times[key] = slot_start(self.today + timedelta(days=day_offset), index)
+        return self.slot_times[key]
+
+    def make_record(self, appointment):
+        rng = self.rng
+        return MedicalRecord(
+            id=uuid.UUID(int=rng.getrandbits(128), version=4),
+            patient_id=appointment.patient_id,
+            doctor_id=appointment.doctor_id,
+            appointment_id=appointment.id,
+            diagnosis=rng.choice(DIAGNOSES),
+            notes=' '.join(rng.choices(NOTE_WORDS, k=rng.randint(8, 24))),
+        )
+
+    def flush(self, appointments, records):
+        if not appointments:
+            return
+        with transaction.atomic():
+            if self.use_copy:
+                copy_rows(Appointment, appointments)
+                copy_rows(MedicalRecord, records)
+            else:
+                Appointment.objects.bulk_create(appointments, batch_size=self.batch_size)
+                MedicalRecord.objects.bulk_create(records, batch_size=self.batch_size)
+        self.counts['appointments'] += len(appointments)
+        self.counts['records'] += len(records)
+        self.log(f"Created {self.counts['appointments']} appointments, {self.counts['records']} records")
+
+
+def copy_rows(model, objs):
+    """Load model instances with PostgreSQL COPY, via psycopg 3 or psycopg2."""
+    if not objs:
+        return
+    fields = model._meta.concrete_fields
+    # Explicit columns, so database-generated ones (e.g. search_vector) are left alone
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(f.column) for f in fields),
+    )
+    rows = ([f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields] for obj in objs)
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            # Strings are quoted and None is left bare, which COPY reads as NULL
+            csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+            buffer.seek(0)
+            cursor.cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.cursor.copy(sql.replace('WITH (FORMAT csv)', '')) as copy:
+                for row in rows:
+                    copy.write_row(row)
@@ -0,0 +1,66 @@
+"""
+Cached HTML for the rows of dashboard tables.
+
+Each row is cached under a key made of the values its HTML shows, e.g. an
+appointment's pk and updated_at plus the related names. Saving an appointment
+stamps a new updated_at, and creating its medical record changes the row's
+record id, so a changed row gets a new key and the stale entry is never read
+again. A table is cached under a key made of its rows' keys, so an unchanged
+table costs one cache read, and a changed one re-renders only its changed
+rows.
+
+Row templates are rendered without the request: they must not use
+{% csrf_token %} or anything else that differs between users. Per-row forms
+point at a shared form on the page with the `form` attribute instead.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def fragment_key(name, *parts):
+    # Rendering also depends on the deploy's templates, the language and the time zone
+    parts = (
+        getattr(settings, 'PAGE_ETAG_SALT', ''), translation.get_language(),
+        timezone.get_current_timezone_name(), *parts,
+    )
+    return f'fragment:{name}:' + hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+class CachedRows:
+    """
+    The rows of one table, rendered from `template_name` when the template
+    prints this object. `key(row)` returns the values the row's HTML depends
+    on; the row is passed to the template as `name`.
+    """
+
+    def __init__(self, template_name, rows, key, name='row'):
+        self.template_name = template_name
+        self.rows = rows
+        self.key = key
+        self.name = name
+        self._html = None
+
+    def render(self):
+        if self._html is None:
+            keys = [fragment_key(self.template_name, *self.key(row)) for row in self.rows]
+            table_key = fragment_key(f'{self.template_name}:table', *keys)
+            html = cache.get(table_key)
+            if html is None:
+                found = cache.get_many(keys)
+                fresh = {}
+                template = get_template(self.template_name)
+                for row, key in zip(self.rows, keys):
+                    if key not in found:
+                        fresh[key] = found[key] = template.render({self.name: row})
+                html = fresh[table_key] = ''.join(found[key] for key in keys)
+                cache.set_many(fresh, FRAGMENT_TIMEOUT)
+            self._html = mark_safe(html)
+        return self._html
+
+    __str__ = __html__ = render
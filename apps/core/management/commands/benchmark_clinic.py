@@ -0,0 +1,206 @@
+import json
+import platform
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.appointments.availability import free_slots
+from apps.appointments.models import Appointment
+from apps.core.datasets import DatasetBuilder
+from apps.records.models import MedicalRecord
+
+SCENARIOS = ['patient_dashboard', 'doctor_dashboard', 'booking_post', 'action_post', 'record_detail', 'api_appointments']
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summarize(samples):
+    latencies = sorted(s['ms'] for s in samples)
+    queries = sorted(s['queries'] for s in samples)
+    return {
+        'requests': len(samples),
+        'latency_ms': {
+            'min': round(latencies[0], 2),
+            'p50': round(percentile(latencies, 50), 2),
+            'p90': round(percentile(latencies, 90), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+        },
+        'queries': {'min': queries[0], 'p50': percentile(queries, 50), 'max': queries[-1]},
+        'db_ms_p50': round(percentile(sorted(s['db_ms'] for s in samples), 50), 2),
+        'bytes_p50': percentile(sorted(s['bytes'] for s in samples), 50),
+        'status_codes': dict(Counter(str(s['status']) for s in samples)),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the clinic hot paths through the test client and print percentiles "
+        "and query counts as JSON. By default a throwaway test database is created "
+        "and filled with a synthetic dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--appointments-per-patient', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=100, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per scenario.")
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help="Run only these (repeatable).")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument(
+            '--existing', action='store_true',
+            help="Benchmark the configured database as-is (e.g. after seed_clinic). "
+                 "The booking and action scenarios write to it.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        old_name = None
+        # The test client talks to 'testserver'
+        hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+        hosts.enable()
+        try:
+            dataset = None
+            if not options['existing']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                dataset = DatasetBuilder(
+                    doctors=options['doctors'],
+                    patients=options['patients'],
+                    appointments_per_patient=options['appointments_per_patient'],
+                    seed=options['seed'],
+                    log=lambda message: self.stderr.write(message),
+                ).build()
+            report = self.run(options, dataset)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            hosts.disable()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run(self, options, dataset):
+        total = options['iterations'] + options['warmup']
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'vendor': connection.vendor,
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'dataset': dataset or {
+                    'doctors': User.objects.filter(role='doctor').count(),
+                    'patients': User.objects.filter(role='patient').count(),
+                    'appointments': Appointment.objects.count(),
+                    'records': MedicalRecord.objects.count(),
+                },
+            },
+            'scenarios': {},
+        }
+        self.clients = {}
+        for name in options['scenario'] or SCENARIOS:
+            requests = getattr(self, f'prepare_{name}')(total)
+            if len(requests) < total:
+                self.stderr.write(f'Skipping {name}: only {len(requests)} of {total} requests could be prepared')
+                continue
+            samples = [self.timed(*request) for request in requests]
+            report['scenarios'][name] = summarize(samples[options['warmup']:])
+            self.stderr.write(f"{name}: p50 {report['scenarios'][name]['latency_ms']['p50']} ms")
+        return report
+
+    def client_for(self, user_id):
+        # One logged-in client per user, so each request reuses a warm session
+        if user_id not in self.clients:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def timed(self, user_id, method, path, data=None):
+        client = self.client_for(user_id)
+        start = time.perf_counter()
+        response = getattr(client, method)(path, data)
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics = response.wsgi_request.metrics
+        return {
+            'ms': elapsed, 'queries': metrics.queries, 'db_ms': metrics.db_ms,
+            'status': response.status_code, 'bytes': len(response.content),
+        }
+
+    def sample(self, values, count):
+        values = list(values)
+        return [self.rng.choice(values) for _ in range(count)] if values else []
+
+    def prepare_patient_dashboard(self, count):
+        patients = Appointment.objects.order_by('pk').values_list('patient_id', flat=True)[:1000]
+        return [(pk, 'get', reverse('patient_dashboard')) for pk in self.sample(patients, count)]
+
+    def prepare_doctor_dashboard(self, count):
+        doctors = Appointment.objects.order_by('pk').values_list('doctor_id', flat=True)[:1000]
+        return [(pk, 'get', reverse('doctor_dashboard')) for pk in self.sample(doctors, count)]
+
+    def prepare_api_appointments(self, count):
+        # Same users as patient_dashboard, for comparing the JSON with the HTML
+        patients = Appointment.objects.order_by('pk').values_list('patient_id', flat=True)[:1000]
+        return [(pk, 'get', reverse('api_appointments')) for pk in self.sample(patients, count)]
+
+    def prepare_record_detail(self, count):
+        records = MedicalRecord.objects.order_by('pk').values_list('pk', 'patient_id')[:1000]
+        return [(patient_id, 'get', reverse('record_detail', args=[pk])) for pk, patient_id in self.sample(records, count)]
+
+    def prepare_action_post(self, count):
+        # Each request confirms a different pending appointment
+        pending = Appointment.objects.filter(
+            status=Appointment.STATUS_PENDING, scheduled_time__gt=timezone.now(),
+        ).order_by('pk').values_list('pk', 'doctor_id')[:count]
+        return [(doctor_id, 'post', reverse('appointment_action', args=[pk, 'confirm'])) for pk, doctor_id in pending]
+
+    def prepare_booking_post(self, count):
+        doctors = list(User.objects.filter(role='doctor').order_by('pk').values_list('pk', flat=True)[:200])
+        patients = list(User.objects.filter(role='patient').order_by('pk').values_list('pk', flat=True)[:1000])
+        if not doctors or not patients:
+            return []
+        start = timezone.localdate() + timedelta(days=1)
+        taken, requests = set(), []
+        for _ in range(count * 3):
+            if len(requests) == count:
+                break
+            doctor_id = self.rng.choice(doctors)
+            day = start + timedelta(days=self.rng.randrange(60))
+            slots = [slot for slot in free_slots(doctor_id, day, day) if (doctor_id, slot) not in taken]
+            if not slots:
+                continue
+            slot = self.rng.choice(slots)
+            taken.add((doctor_id, slot))
+            data = {
+                'doctor': doctor_id,
+                'scheduled_time': timezone.localtime(slot).strftime('%Y-%m-%d %H:%M:%S'),
+                'reason_for_visit': 'Benchmark booking',
+            }
+            requests.append((self.rng.choice(patients), 'post', reverse('book_appointment'), data))
+        return requests
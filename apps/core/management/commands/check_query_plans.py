@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.accounts.models import User
+from apps.appointments.models import Appointment
+from apps.core.query_plans import PLAN_VENDORS, dashboard_queries, full_scans
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the dashboard and history queries and fail if any of them reads a whole table "
+        "or index instead of searching an index. Run it against a seeded database (seed_clinic)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', help="Email of the patient to plan for; defaults to the latest booking's.")
+        parser.add_argument('--doctor', help="Email of the doctor to plan for; defaults to the latest booking's.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in PLAN_VENDORS:
+            raise CommandError(f"Query plans can't be checked on {connection.vendor}.")
+        latest = Appointment.objects.order_by('-created_at').only('patient', 'doctor').first()
+        if latest is None and not (options['patient'] and options['doctor']):
+            raise CommandError("No appointments to plan for; seed some data first or pass --patient and --doctor.")
+        patient = self.user(options['patient'], 'patient', latest and latest.patient_id)
+        doctor = self.user(options['doctor'], 'doctor', latest and latest.doctor_id)
+
+        failed = []
+        for name, queryset in dashboard_queries(patient, doctor).items():
+            plan, scans = full_scans(queryset)
+            if scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(scans)}"))
+            else:
+                self.stdout.write(f"{name}: ok")
+            if scans or options['verbosity'] > 1:
+                self.stdout.write(plan + '\n')
+        if failed:
+            raise CommandError(f"{len(failed)} queries read a table in full: {', '.join(failed)}.")
+        self.stdout.write(self.style.SUCCESS("Every dashboard query is answered from indexes."))
+
+    def user(self, email, role, default_pk):
+        users = User.objects.filter(role=role)
+        user = users.filter(email=email).first() if email else users.filter(pk=default_pk).first()
+        if user is None:
+            raise CommandError(f"No {role} {email or default_pk}.")
+        return user
@@ -0,0 +1,51 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.core import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Process outbox messages: claim due batches with SELECT ... FOR UPDATE SKIP LOCKED "
+        "and run their handlers on a thread pool. Run several for more throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--threads', type=int, default=4, help="Handler threads; 1 runs handlers inline.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when idle.")
+        parser.add_argument('--max-attempts', type=int, default=outbox.MAX_ATTEMPTS,
+                            help="Messages that failed this often are left for inspection in the admin.")
+        parser.add_argument('--retention-days', type=int, default=7,
+                            help="Processed messages older than this are deleted while idle.")
+        parser.add_argument('--once', action='store_true', help="Drain what is due now and exit.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        if not options['once']:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        executor = ThreadPoolExecutor(options['threads']) if options['threads'] > 1 else None
+        processed = 0
+        try:
+            while not self.stopping:
+                claimed = outbox.process_batch(options['batch_size'], executor, options['max_attempts'])
+                processed += claimed
+                if claimed:
+                    continue
+                outbox.purge_processed(timezone.now() - timedelta(days=options['retention_days']))
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        finally:
+            if executor:
+                executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} outbox messages."))
+
+    def stop(self, signum, frame):
+        # Finish the current batch, then exit
+        self.stopping = True
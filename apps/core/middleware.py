@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('apps.core.metrics')
+
+# Metrics of the request being served. A context variable rather than a
+# per-connection wrapper, because async views query from other threads (with
+# their own connections) and the context follows them there.
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Query count and timings collected for a single request (milliseconds)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.total_ms = 0.0
+        self.view_name = None
+        self._started = time.perf_counter()
+        self._render_started = None
+        self._lock = threading.Lock()
+
+    def record_query(self, elapsed_ms):
+        with self._lock:
+            self.db_ms += elapsed_ms
+            self.queries += 1
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 1),
+            'template_ms': round(self.template_ms, 1),
+            'total_ms': round(self.total_ms, 1),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper installed on every connection; reports to the current request, if any."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query((time.perf_counter() - start) * 1000)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Count queries and time the database, template rendering and the whole request.
+
+    The numbers end up on request.metrics, in a Server-Timing header (when
+    SERVER_TIMING is on) and in one log line per request on `apps.core.metrics`.
+    Requests slower than SLOW_REQUEST_MS are logged as warnings. Streaming
+    responses are timed until the view returns, not until the body is sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request):
+        # Connections opened before this module was loaded never saw connection_created
+        for conn in connections.all(initialized_only=True):
+            install_query_recorder(None, conn)
+        request.metrics = RequestMetrics()
+        return current_metrics.set(request.metrics)
+
+    def finish(self, request, response):
+        metrics = request.metrics
+        metrics.total_ms = (time.perf_counter() - metrics._started) * 1000
+        match = getattr(request, 'resolver_match', None)
+        metrics.view_name = match.view_name if match else None
+
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = metrics.server_timing()
+        slow = metrics.total_ms >= getattr(settings, 'SLOW_REQUEST_MS', 500)
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            'view=%s method=%s status=%s queries=%d db_ms=%.1f template_ms=%.1f total_ms=%.1f',
+            metrics.view_name or '-', request.method, response.status_code, metrics.queries,
+            metrics.db_ms, metrics.template_ms, metrics.total_ms,
+            extra={'metrics': metrics.as_dict(), 'path': request.path, 'status': response.status_code},
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before a TemplateResponse is rendered
+        metrics = request.metrics
+        metrics._render_started = time.perf_counter()
+
+        def rendered(response):
+            metrics.template_ms += (time.perf_counter() - metrics._render_started) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -1,29 +1,72 @@
+from asgiref.sync import sync_to_async
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.mixins import AccessMixin
+from .concurrency import run_concurrently
+from .conditional import ConditionalGetMixin
+
+class RoleRequiredMixin(AccessMixin):
+    """Verify that the current user is authenticated and has_role(); works for sync and async views."""
+    def has_role(self, user):
+        raise NotImplementedError
 
-class PatientRequiredMixin(AccessMixin):
-    """Verify that the current user is authenticated and is a patient."""
     def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch(request, *args, **kwargs)
         if not request.user.is_authenticated:
             return self.handle_no_permission()
-        if not request.user.is_patient:
+        if not self.has_role(request.user):
             raise PermissionDenied
         return super().dispatch(request, *args, **kwargs)
 
-class DoctorRequiredMixin(AccessMixin):
-    """Verify that the current user is authenticated and is a doctor."""
-    def dispatch(self, request, *args, **kwargs):
+    async def adispatch(self, request, *args, **kwargs):
+        # Resolve the lazy user off the event loop once; templates then read it directly
+        request.user = await request.auser()
         if not request.user.is_authenticated:
             return self.handle_no_permission()
-        if not request.user.is_doctor:
+        if not self.has_role(request.user):
             raise PermissionDenied
-        return super().dispatch(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+class PatientRequiredMixin(RoleRequiredMixin):
+    """Verify that the current user is authenticated and is a patient."""
+    def has_role(self, user):
+        return user.is_patient
+
+class DoctorRequiredMixin(RoleRequiredMixin):
+    """Verify that the current user is authenticated and is a doctor."""
+    def has_role(self, user):
+        return user.is_doctor
 
-class AdminRequiredMixin(AccessMixin):
+class AdminRequiredMixin(RoleRequiredMixin):
     """Verify that the current user is authenticated and is an admin."""
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return self.handle_no_permission()
-        if not request.user.is_admin and not request.user.is_superuser:
-            raise PermissionDenied
-        return super().dispatch(request, *args, **kwargs)
+    def has_role(self, user):
+        return user.is_admin or user.is_superuser
+
+class ContextQueriesMixin:
+    """
+    Build the template context from independent queries.
+
+    get_context_queries() returns {context key: callable}. Keys already passed to
+    get_context_data() are not run again, which is how the async variant hands
+    in results it fetched concurrently.
+    """
+    def get_context_queries(self):
+        return {}
+
+    def get_context_data(self, **kwargs):
+        for key, query in self.get_context_queries().items():
+            if key not in kwargs:
+                kwargs[key] = query()
+        return super().get_context_data(**kwargs)
+
+class AsyncContextQueriesMixin:
+    """Async GET for a ContextQueriesMixin view: the context queries run concurrently."""
+    async def get(self, request, *args, **kwargs):
+        conditional = isinstance(self, ConditionalGetMixin)
+        if conditional:
+            response = await sync_to_async(self.not_modified)()
+            if response is not None:
+                return self.add_validators(response)
+        results = await run_concurrently(self.get_context_queries())
+        response = self.render_to_response(self.get_context_data(**kwargs, **results))
+        return self.add_validators(response) if conditional else response
@@ -1,3 +1,34 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxMessage(models.Model):
+    """
+    A side effect to run after a transaction commits (see apps.core.outbox).
+
+    Rows are written in the same transaction as the change they describe and
+    picked up by `manage.py run_outbox_worker`.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Failed messages are retried with backoff by pushing this forward
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # The worker's claim query only ever looks at unprocessed rows
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
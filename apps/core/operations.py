@@ -0,0 +1,40 @@
+"""
+Migration operations for indexes on the busy tables.
+
+On PostgreSQL indexes are built and dropped CONCURRENTLY, so a deploy doesn't
+block writes to appointments or records for the length of the build. That
+can't run inside a transaction: migrations using these set atomic = False.
+Other backends (SQLite in dev) get a plain CREATE/DROP INDEX. Like
+django.contrib.postgres.operations, without needing a PostgreSQL connection.
+"""
+from django.db import migrations
+
+
+def index_options(schema_editor):
+    return {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **index_options(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **index_options(schema_editor))
+
+
+class RemoveIndexConcurrently(migrations.RemoveIndex):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.remove_index(model, index, **index_options(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+            schema_editor.add_index(model, index, **index_options(schema_editor))
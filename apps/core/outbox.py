@@ -0,0 +1,103 @@
+"""
+Transactional outbox for side effects of bookings and status changes.
+
+Code that changes state calls enqueue() inside its transaction, so the message
+commits or rolls back together with the change, and the request itself only
+pays for one INSERT. `manage.py run_outbox_worker` claims pending messages
+with SELECT ... FOR UPDATE SKIP LOCKED and runs the handlers registered for
+their topic on a thread pool.
+
+Handlers get the payload dict. They may run more than once, for example after
+a crash between running the handler and marking the message, so they should be
+idempotent and re-read any state they depend on.
+"""
+import logging
+from datetime import timedelta
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import OutboxMessage
+
+logger = logging.getLogger('apps.core.outbox')
+
+MAX_ATTEMPTS = 5
+# Retry backoff: 2, 4, 8... seconds, capped
+MAX_BACKOFF = timedelta(minutes=10)
+
+_handlers = {}
+
+
+def handler(topic):
+    """Register a function(payload) to run for every message on `topic`."""
+    def register(func):
+        _handlers.setdefault(topic, []).append(func)
+        return func
+    return register
+
+
+def enqueue(topic, payload):
+    """Record a side effect in the current transaction."""
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def handle(message):
+    """Run every handler for `message`. Returns None, or the error text."""
+    handlers = _handlers.get(message.topic)
+    if not handlers:
+        return f"No handler registered for topic {message.topic!r}"
+    try:
+        # Run inline, handlers share the connection holding the claim; the
+        # savepoint keeps a failed query from breaking that transaction
+        with transaction.atomic():
+            for func in handlers:
+                func(message.payload)
+    except Exception as e:
+        logger.exception("Outbox message %s (%s) failed", message.pk, message.topic)
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def handle_in_pool(message):
+    """handle() on a pool thread, which keeps its own connection."""
+    # Same max-age/health rules as a request. Never on the claiming thread:
+    # Django closes a connection caught inside a transaction.
+    close_old_connections()
+    try:
+        return handle(message)
+    finally:
+        close_old_connections()
+
+
+def process_batch(batch_size=100, executor=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Claim up to `batch_size` due messages, run their handlers and record the outcome.
+
+    Rows stay locked until the outcome is saved, so concurrent workers skip them
+    instead of running them twice. Returns the number of messages claimed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, available_at__lte=now, attempts__lt=max_attempts)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+        errors = list(executor.map(handle_in_pool, batch)) if executor else [handle(message) for message in batch]
+
+        done = timezone.now()
+        for message, error in zip(batch, errors):
+            if error is None:
+                message.processed_at = done
+                continue
+            message.attempts += 1
+            message.last_error = error
+            message.available_at = done + min(timedelta(seconds=2 ** message.attempts), MAX_BACKOFF)
+        OutboxMessage.objects.bulk_update(batch, ['processed_at', 'attempts', 'last_error', 'available_at'])
+    return len(batch)
+
+
+def purge_processed(older_than, batch_size=10000):
+    """Delete messages processed before `older_than`, a bounded batch at a time."""
+    ids = OutboxMessage.objects.filter(processed_at__lt=older_than).values_list('pk', flat=True)[:batch_size]
+    return OutboxMessage.objects.filter(pk__in=list(ids)).delete()[0]
@@ -0,0 +1,91 @@
+import base64
+import binascii
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """One page of a keyset-paginated list plus the cursor for the next page."""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (value, pk) for a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.split('|', 1)
+        value = parse_datetime(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if value is None or not pk:
+        return None
+    return value, pk
+
+
+def seek(queryset, field, cursor=None):
+    """
+    Order `queryset` newest first on (field, pk) and skip to the row after
+    `cursor`. Rows are located by seeking past the last row of the previous
+    page rather than with OFFSET, so a deep page costs the same as the first.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        try:
+            pk = queryset.model._meta.pk.to_python(pk)
+        except ValidationError:
+            # Tampered cursor - fall back to the first page
+            pk = None
+        if pk is not None:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            )
+    return queryset
+
+
+def paginate_keyset(queryset, field, cursor=None, per_page=20):
+    """Return the page of `queryset` ordered newest first on (field, pk) that follows `cursor`."""
+    queryset = seek(queryset, field, cursor)
+    # Fetch one extra row to learn whether another page exists
+    return keyset_page(list(queryset[:per_page + 1]), field, per_page)
+
+
+def keyset_page(rows, field, per_page):
+    """KeysetPage of `rows`, read newest first with one row more than `per_page`."""
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(rows, next_cursor)
+
+
+def cursor_url(request, param, cursor):
+    """Current query string with `param` set to `cursor`, for "load more" links."""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query[param] = cursor
+    return f"?{query.urlencode()}"
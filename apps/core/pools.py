@@ -0,0 +1,16 @@
+from django.db import connections
+
+
+def open_connection_pools():
+    """
+    Start filling the connection pool of every database configured with one
+    (DB_POOL=1), so the first requests find connections ready.
+
+    Call it in each worker process after it has forked, never before: pool
+    threads and sockets don't survive a fork. It doesn't wait for the
+    database, so a worker still starts while the database is down.
+    """
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor == 'postgresql' and connection.settings_dict['OPTIONS'].get('pool'):
+            connection.pool.open(wait=False)
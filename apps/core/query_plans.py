@@ -0,0 +1,77 @@
+"""
+EXPLAIN the queries behind the dashboards and history pages, to check that no
+table is read in full, neither sequentially nor by walking a whole index.
+
+On PostgreSQL sequential scans are switched off for the check, so small or
+unanalyzed tables don't hide a missing index: the planner still picks a Seq
+Scan when no index can answer the query, and only then.
+"""
+import json
+import re
+import uuid
+from django.db import connections, transaction
+from django.utils import timezone
+from apps.appointments.archive import archived_until
+from apps.appointments.models import ArchivedAppointment
+from apps.appointments.services import agenda_appointments, doctor_completed_appointments
+from .pagination import encode_cursor, seek
+from .views import completed_page_patients, patient_history, patient_records, patient_upcoming
+
+PLAN_VENDORS = ('postgresql', 'sqlite')
+
+# "SCAN table", with or without "USING INDEX": either way every row is visited
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)')
+
+
+def dashboard_queries(patient, doctor):
+    """The dashboards' querysets for `patient` and `doctor`, by name. History pages are read past a cursor."""
+    now = timezone.now()
+    # A cursor as "load more" links carry them, so the seek condition is planned too
+    cursor = encode_cursor(now, uuid.UUID(int=0))
+    queries = {
+        'patient upcoming': patient_upcoming(patient),
+        'patient history': seek(patient_history(patient), 'scheduled_time', cursor),
+        'patient records': seek(patient_records(patient), 'created_at', cursor),
+        'doctor agenda': agenda_appointments(doctor, now),
+        'doctor completed': seek(doctor_completed_appointments(doctor), 'scheduled_time', cursor),
+        # Whose names the dashboard ETag covers
+        'doctor completed patients': completed_page_patients(doctor, cursor),
+    }
+    # History pages don't read an empty archive, so neither does the check
+    if archived_until() is not None:
+        queries['patient archived history'] = seek(
+            patient_history(patient, ArchivedAppointment), 'scheduled_time', cursor
+        )
+        queries['doctor archived completed'] = seek(
+            doctor_completed_appointments(doctor, ArchivedAppointment), 'scheduled_time', cursor
+        )
+    return queries
+
+
+def postgres_full_scans(node):
+    """Tables read in full in a PostgreSQL JSON plan node and its children."""
+    tables = []
+    # An index scan without an Index Cond walks the whole index, e.g. for ORDER BY
+    if node['Node Type'] == 'Seq Scan' or (
+        node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node
+    ):
+        tables.append(node['Relation Name'])
+    for child in node.get('Plans', []):
+        tables.extend(postgres_full_scans(child))
+    return tables
+
+
+def full_scans(queryset, using='default'):
+    """(plan, tables `queryset` reads in full) on `using`."""
+    queryset = queryset.using(using)
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        plan = queryset.explain()
+        return plan, SQLITE_FULL_SCAN.findall(plan)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        tables = postgres_full_scans(json.loads(queryset.explain(format='json'))[0]['Plan'])
+        # In case the caller's transaction goes on
+        cursor.execute('RESET enable_seqscan')
+    return plan, tables
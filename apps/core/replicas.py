@@ -0,0 +1,112 @@
+"""
+Read-replica routing.
+
+Views with `read_from_replica = True` read clinical data from one of
+DATABASE_REPLICAS. Everything else, and every write, goes to the primary.
+A request that writes (booking, status actions, anything saved through the
+ORM) sets a short-lived cookie, and the browser's requests are kept on the
+primary until it expires, so people see their own changes despite replication
+lag.
+
+Sessions and users are always read from the primary, so a fresh login or
+registration never looks missing.
+"""
+import random
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'db_primary_until'
+
+# Apps whose models may be read from a replica
+REPLICA_APPS = {'appointments', 'records'}
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+class Routing:
+    """Routing state of one request. Mutated, never replaced, so threads that copied the context see changes."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.read_alias = None
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or routing.read_alias is None or routing.wrote:
+            return None
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        return routing.read_alias
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        aliases = {'default', *getattr(settings, 'DATABASE_REPLICAS', [])}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    """Track reads and writes per request; send opted-in views to a replica unless pinned."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_routing.set(Routing(is_pinned(request)))
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            current_routing.reset(token)
+
+    async def __acall__(self, request):
+        token = current_routing.set(Routing(is_pinned(request)))
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            current_routing.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        view_class = getattr(view_func, 'view_class', None)
+        if routing and replicas and not routing.pinned and getattr(view_class, 'read_from_replica', False):
+            routing.read_alias = random.choice(replicas)
+        return None
+
+    def finish(self, request, response):
+        routing = current_routing.get()
+        if routing.wrote and getattr(settings, 'DATABASE_REPLICAS', []):
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.0f}', max_age=seconds,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
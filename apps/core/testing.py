@@ -0,0 +1,21 @@
+class QueryBudgetMixin:
+    """
+    TestCase mixin for per-view query budgets.
+
+    Declare `query_budgets = {'url_name': max_queries}` on the test case and call
+    assertWithinBudget(response) on test client responses. The count comes from
+    RequestMetricsMiddleware, so it covers the whole request: session, user,
+    view and template.
+    """
+    query_budgets = {}
+
+    def assertWithinBudget(self, response):
+        metrics = response.wsgi_request.metrics
+        view_name = metrics.view_name
+        self.assertIn(view_name, self.query_budgets, f'No query budget declared for {view_name!r}')
+        budget = self.query_budgets[view_name]
+        self.assertLessEqual(
+            metrics.queries, budget,
+            f'{view_name} ran {metrics.queries} queries, budget is {budget}',
+        )
+        return metrics
@@ -1,3 +1,627 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+from datetime import datetime, timedelta
+from django.db import close_old_connections, connection, connections, router, transaction
+from django.http import HttpResponse
+from django.views import View
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from apps.appointments.models import Appointment
+from apps.records.models import MedicalRecord
+from asgiref.sync import sync_to_async
+from django.core.exceptions import PermissionDenied
+from django.test import AsyncRequestFactory, RequestFactory
+from django.test.signals import template_rendered
+from . import outbox
+from .concurrency import run_concurrently
+from .datasets import DatasetBuilder
+from .models import OutboxMessage
+from .query_plans import full_scans
+from .replicas import PIN_COOKIE, ReplicaRoutingMiddleware
+from .views import AsyncDoctorDashboardView, AsyncPatientDashboardView, DoctorDashboardView, PatientDashboardView
+from .testing import QueryBudgetMixin
 
-# Create your tests here.
+User = get_user_model()
+
+class DashboardQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+
+    def add_appointments(self, count):
+        """Create one appointment in every dashboard bucket per iteration."""
+        now = timezone.now()
+        for i in range(count):
+            # Each patient is a separate user so the doctor dashboard would N+1 on them
+            patient = User.objects.create(email=f'p{i}-{now.timestamp()}@test.com', role='patient', first_name='P', last_name=str(i))
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now + timedelta(days=1, minutes=i), status=Appointment.STATUS_PENDING)
+            Appointment.objects.create(patient=patient, doctor=self.doctor, scheduled_time=now + timedelta(days=2, minutes=i), status=Appointment.STATUS_PENDING)
+            completed = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now - timedelta(days=1, minutes=i), status=Appointment.STATUS_COMPLETED)
+            MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=completed, diagnosis='Flu', notes='Rest')
+            Appointment.objects.create(patient=patient, doctor=self.doctor, scheduled_time=now - timedelta(days=2, minutes=i), status=Appointment.STATUS_COMPLETED)
+
+    def test_patient_dashboard_query_count_is_constant(self):
+        """Patient dashboard cost does not grow with the number of rows"""
+        self.client.login(email=self.patient.email, password='pw')
+        self.add_appointments(1)
+        # Session and user come from the cache once warm; the first two queries are the
+        # ETag's, and the history page is short, so it reads the archive too
+        self.client.get(reverse('patient_dashboard'))
+        with self.assertNumQueries(6):
+            self.client.get(reverse('patient_dashboard'))
+        self.add_appointments(5)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('patient_dashboard'))
+        self.assertContains(response, 'Dr. Test')
+
+    def test_doctor_dashboard_query_count_is_constant(self):
+        """Doctor dashboard cost does not grow with the number of rows"""
+        self.client.login(email=self.doctor.email, password='pw')
+        self.add_appointments(1)
+        # ETag (two), agenda, completed page, and the archive as that page is short
+        self.client.get(reverse('doctor_dashboard'))
+        with self.assertNumQueries(5):
+            self.client.get(reverse('doctor_dashboard'))
+        self.add_appointments(5)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('doctor_dashboard'))
+        self.assertContains(response, 'Record Created')
+        self.assertContains(response, 'Create')
+
+class RequestMetricsTests(QueryBudgetMixin, TestCase):
+    # Cold session/user cache included, so these are the worst case per request.
+    # History and completed pages are short here, so they read the archive too.
+    query_budgets = {
+        'patient_dashboard': 7,
+        'doctor_dashboard': 6,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        now = timezone.now()
+        for days in (1, -1):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now + timedelta(days=days), status=Appointment.STATUS_CONFIRMED)
+
+    def test_dashboards_within_budget(self):
+        self.client.login(email=self.patient.email, password='pw')
+        self.assertWithinBudget(self.client.get(reverse('patient_dashboard')))
+        self.client.login(email=self.doctor.email, password='pw')
+        self.assertWithinBudget(self.client.get(reverse('doctor_dashboard')))
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header_and_log_line(self):
+        self.client.login(email=self.patient.email, password='pw')
+        with self.assertLogs('apps.core.metrics', 'INFO') as logs:
+            response = self.client.get(reverse('patient_dashboard'))
+        metrics = response.wsgi_request.metrics
+        self.assertEqual(metrics.view_name, 'patient_dashboard')
+        self.assertGreater(metrics.template_ms, 0)
+        self.assertIn(f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"', response['Server-Timing'])
+        self.assertIn('view=patient_dashboard method=GET status=200', logs.output[0])
+        self.assertEqual(logs.records[0].metrics['queries'], metrics.queries)
+
+    def test_server_timing_off_by_default(self):
+        self.client.login(email=self.patient.email, password='pw')
+        self.assertNotIn('Server-Timing', self.client.get(reverse('patient_dashboard')))
+
+class AsyncDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        now = timezone.now()
+        for days in (2, -2, -3):
+            status = Appointment.STATUS_CONFIRMED if days > 0 else Appointment.STATUS_COMPLETED
+            appt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now + timedelta(days=days), status=status)
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=appt, diagnosis='Flu', notes='Rest')
+
+    async def get_async(self, view_class, user, path='/'):
+        request = AsyncRequestFactory().get(path)
+
+        async def auser():
+            return user
+        request.auser = auser
+        response = await view_class.as_view()(request)
+        await sync_to_async(response.render)()
+        return response
+
+    def get_sync(self, view_class, user, path='/'):
+        request = RequestFactory().get(path)
+        request.user = user
+        return view_class.as_view()(request).render()
+
+    def pks(self, context, key):
+        return [obj.pk for obj in context[key]]
+
+    async def test_async_patient_dashboard_matches_sync(self):
+        response = await self.get_async(AsyncPatientDashboardView, self.patient)
+        expected = (await sync_to_async(self.get_sync)(PatientDashboardView, self.patient)).context_data
+        for key in ('upcoming_appointments', 'past_appointments', 'medical_records'):
+            self.assertEqual(self.pks(response.context_data, key), self.pks(expected, key))
+        self.assertEqual(len(response.context_data['past_appointments']), 2)
+        self.assertContains(response, 'Dr. Test')
+
+    async def test_async_doctor_dashboard_matches_sync(self):
+        response = await self.get_async(AsyncDoctorDashboardView, self.doctor)
+        expected = (await sync_to_async(self.get_sync)(DoctorDashboardView, self.doctor)).context_data
+        for key in ('upcoming_appointments', 'completed_appointments'):
+            self.assertEqual(self.pks(response.context_data, key), self.pks(expected, key))
+        self.assertEqual(len(response.context_data['completed_appointments']), 2)
+
+    async def test_async_dashboard_checks_role(self):
+        with self.assertRaises(PermissionDenied):
+            await self.get_async(AsyncPatientDashboardView, self.doctor)
+
+class ConcurrentQueriesTests(TransactionTestCase):
+    # Committed rows and no surrounding transaction, so other connections may be used
+    def setUp(self):
+        User.objects.create_user(email='pat@test.com', password='pw', role='patient')
+
+    async def test_queries_run_on_their_own_connections(self):
+        """Off SQLite, each query runs at the same time as the others, on its own connection"""
+        request_connection = connections['default']
+        # Each query waits for the other, so running them one after another fails
+        barrier = threading.Barrier(2, timeout=5)
+
+        def query():
+            barrier.wait()
+            return list(User.objects.values_list('email', flat=True)), threading.get_ident(), connections['default']
+
+        # On the class: the request's connection is another wrapper in the thread that checks it
+        with mock.patch.object(type(connections['default']), 'vendor', 'postgresql'), \
+                mock.patch('apps.core.concurrency.close_old_connections', wraps=close_old_connections) as close_old:
+            results = await run_concurrently({'a': query, 'b': query})
+        (emails_a, thread_a, connection_a), (emails_b, thread_b, connection_b) = results['a'], results['b']
+        self.assertEqual(emails_a, ['pat@test.com'])
+        self.assertEqual(emails_b, ['pat@test.com'])
+        self.assertNotEqual(thread_a, thread_b)
+        self.assertNotIn(threading.get_ident(), (thread_a, thread_b))
+        self.assertIsNot(connection_a, connection_b)
+        self.assertNotIn(request_connection, (connection_a, connection_b))
+        # Before and after each query, as around a request
+        self.assertEqual(close_old.call_count, 4)
+
+class ConditionalDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        self.appt = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            scheduled_time=timezone.now() + timedelta(days=1), status=Appointment.STATUS_PENDING
+        )
+
+    def warm_etag(self, url):
+        # The first response sets the CSRF cookie, which is part of the ETag
+        self.client.get(url)
+        return self.client.get(url)['ETag']
+
+    def test_unchanged_dashboard_is_not_modified(self):
+        self.client.login(email=self.patient.email, password='pw')
+        url = reverse('patient_dashboard')
+        etag = self.warm_etag(url)
+        # The change stamp, and the doctors whose names the page shows
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.templates)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_dashboard_etag_follows_appointment_changes(self):
+        self.client.login(email=self.doctor.email, password='pw')
+        url = reverse('doctor_dashboard')
+        etag = self.warm_etag(url)
+        Appointment.objects.filter(pk=self.appt.pk).transition('confirm')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # A deleted row changes the count even though no timestamp moved forward
+        etag = response['ETag']
+        self.appt.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_doctor_dashboard_etag_drops_passed_pending_requests(self):
+        """A pending request whose time has passed leaves the page though its row is untouched"""
+        self.client.login(email=self.doctor.email, password='pw')
+        url = reverse('doctor_dashboard')
+        etag = self.warm_etag(url)
+        # update() leaves the auto_now updated_at alone, as the clock passing would
+        Appointment.objects.filter(pk=self.appt.pk).update(scheduled_time=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(Appointment.objects.get(pk=self.appt.pk).updated_at, self.appt.updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['pending_appointments'], [])
+
+    def test_dashboard_etag_follows_counterpart_renames(self):
+        """Each dashboard shows the other side's name, which lives on their user row"""
+        for viewer, counterpart, url in (
+            (self.patient, self.doctor, reverse('patient_dashboard')),
+            (self.doctor, self.patient, reverse('doctor_dashboard')),
+        ):
+            self.client.login(email=viewer.email, password='pw')
+            etag = self.warm_etag(url)
+            counterpart.last_name = f'Renamed {counterpart.role}'
+            counterpart.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, counterpart.last_name)
+
+    def test_etag_is_per_user(self):
+        other = User.objects.create_user(email='pat2@test.com', password='pw', role='patient')
+        self.client.login(email=self.patient.email, password='pw')
+        etag = self.warm_etag(reverse('patient_dashboard'))
+        self.client.login(email=other.email, password='pw')
+        response = self.client.get(reverse('patient_dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_pending_messages_are_always_rendered(self):
+        self.client.login(email=self.doctor.email, password='pw')
+        url = reverse('doctor_dashboard')
+        etag = self.warm_etag(url)
+        # Redirects back to the dashboard with a flash message, though nothing changed
+        self.client.post(reverse('bulk_appointment_action', args=['confirm']))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '0 of 0 appointment(s) updated.')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    async def test_async_dashboard_not_modified(self):
+        request = AsyncRequestFactory().get('/')
+        patient = self.patient
+
+        async def auser():
+            return patient
+        request.auser = auser
+        response = await AsyncPatientDashboardView.as_view()(request)
+        request = AsyncRequestFactory().get('/', headers={'If-None-Match': response['ETag']})
+        request.auser = auser
+        response = await AsyncPatientDashboardView.as_view()(request)
+        self.assertEqual(response.status_code, 304)
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='Pat', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', last_name='Test')
+        now = timezone.now()
+        self.pending = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=now + timedelta(days=1, hours=i), reason_for_visit=f'Visit {i}')
+            for i in range(3)
+        ]
+        self.completed = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, scheduled_time=now - timedelta(days=1), status=Appointment.STATUS_COMPLETED
+        )
+        self.client.login(email=self.doctor.email, password='pw')
+
+    def get_dashboard(self):
+        """The dashboard response and how many rows of each table were rendered for it."""
+        rendered = []
+
+        def on_render(sender, template, context, **kwargs):
+            rendered.append(template.name)
+        template_rendered.connect(on_render)
+        try:
+            response = self.client.get(reverse('doctor_dashboard'))
+        finally:
+            template_rendered.disconnect(on_render)
+        return response, {name.split('/')[-1]: rendered.count(name) for name in rendered if '/rows/' in name}
+
+    def test_only_changed_rows_are_rendered(self):
+        response, rows = self.get_dashboard()
+        self.assertEqual(rows, {'doctor_pending.html': 3, 'doctor_completed.html': 1})
+        self.assertEqual(self.get_dashboard()[1], {})
+
+        appt = self.pending[1]
+        appt.reason_for_visit = 'Changed reason'
+        appt.save()
+        response, rows = self.get_dashboard()
+        self.assertEqual(rows, {'doctor_pending.html': 1})
+        self.assertContains(response, 'Changed reason')
+        self.assertContains(response, 'Visit 2')
+
+    def test_new_medical_record_refreshes_the_row(self):
+        self.assertContains(self.get_dashboard()[0], 'Create Record')
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=self.completed, diagnosis='Flu', notes='Rest')
+        response, rows = self.get_dashboard()
+        self.assertEqual(rows, {'doctor_completed.html': 1})
+        self.assertContains(response, 'Record Created')
+        self.assertNotContains(response, 'Create Record')
+
+    def test_rows_carry_no_csrf_token(self):
+        response = self.get_dashboard()[0]
+        # The shared action form, the pending bulk form and the two logout forms
+        self.assertContains(response, 'csrfmiddlewaretoken', count=4)
+        self.assertContains(response, f'form="appointment-actions" formaction="{reverse("appointment_action", args=[self.pending[0].pk, "confirm"])}"')
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_PIN_SECONDS=15)
+class ReplicaRoutingTests(SimpleTestCase):
+    def request(self, read_from_replica, write=False, cookies=None):
+        """Run a probe view through the middleware; returns (response, databases it would use)."""
+        used = {}
+
+        class ProbeView(View):
+            def get(self, request):
+                used['appointments'] = Appointment.objects.all().db
+                used['users'] = User.objects.all().db
+                if write:
+                    router.db_for_write(Appointment)
+                    used['after_write'] = MedicalRecord.objects.all().db
+                return HttpResponse()
+        ProbeView.read_from_replica = read_from_replica
+        view = ProbeView.as_view()
+
+        def get_response(request):
+            # The handler calls process_view before the view
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = ReplicaRoutingMiddleware(get_response)
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return middleware(request), used
+
+    def test_read_only_views_use_a_replica(self):
+        response, used = self.request(read_from_replica=True)
+        self.assertEqual(used, {'appointments': 'replica_0', 'users': 'default'})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.request(read_from_replica=False)[1]['appointments'], 'default')
+
+    def test_write_pins_the_browser_to_the_primary(self):
+        response, used = self.request(read_from_replica=True, write=True)
+        self.assertEqual(used['after_write'], 'default')
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin['max-age'], 15)
+
+        _, used = self.request(read_from_replica=True, cookies={PIN_COOKIE: pin.value})
+        self.assertEqual(used['appointments'], 'default')
+        # An expired pin no longer counts
+        _, used = self.request(read_from_replica=True, cookies={PIN_COOKIE: str(int(time.time()) - 1)})
+        self.assertEqual(used['appointments'], 'replica_0')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        response, used = self.request(read_from_replica=True, write=True)
+        self.assertEqual(used['appointments'], 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient', first_name='P', last_name='Test')
+        self.doctor = User.objects.create_user(email='doc@test.com', password='pw', role='doctor', first_name='D', last_name='Test')
+        past = timezone.now() - timedelta(days=3)
+        # Half the rows share a timestamp so the id tie-breaker is exercised
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, scheduled_time=past - timedelta(hours=i % 13), status=Appointment.STATUS_COMPLETED)
+            for i in range(25)
+        ]
+
+    def test_past_appointments_keyset_pages(self):
+        """Following the cursor walks every past appointment exactly once"""
+        self.client.login(email=self.patient.email, password='pw')
+        response = self.client.get(reverse('patient_dashboard'))
+        first = list(response.context['past_appointments'])
+        self.assertEqual(len(first), 20)
+        self.assertIsNotNone(response.context['past_more_url'])
+
+        response = self.client.get(reverse('patient_dashboard') + response.context['past_more_url'])
+        second = list(response.context['past_appointments'])
+        self.assertEqual(len(second), 5)
+        self.assertIsNone(response.context['past_more_url'])
+        self.assertEqual({a.pk for a in first + second}, {a.pk for a in self.appointments})
+
+    def test_completed_visits_page_past_a_quiet_month(self):
+        """The first completed page fills from older visits when the last month had few"""
+        recent = self.appointments[0]
+        for appt in self.appointments[1:16]:
+            appt.scheduled_time -= timedelta(days=60)
+            appt.save()
+        Appointment.objects.filter(pk__in=[appt.pk for appt in self.appointments[16:]]).delete()
+        self.client.login(email=self.doctor.email, password='pw')
+        response = self.client.get(reverse('doctor_dashboard'))
+        first = list(response.context['completed_appointments'])
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first[0], recent)
+        self.assertIsNotNone(response.context['completed_more_url'])
+
+        response = self.client.get(reverse('doctor_dashboard') + response.context['completed_more_url'])
+        second = list(response.context['completed_appointments'])
+        self.assertEqual(len(second), 6)
+        self.assertIsNone(response.context['completed_more_url'])
+        self.assertEqual({a.pk for a in first + second}, {a.pk for a in self.appointments[:16]})
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """A garbled cursor is treated as the start of the list"""
+        self.client.login(email=self.patient.email, password='pw')
+        response = self.client.get(reverse('patient_dashboard'), {'past_cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['past_appointments']), 20)
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_superuser(email='admin@test.com', password='pw', role='admin')
+        self.patient = User.objects.create_user(email='pat@test.com', password='pw', role='patient')
+        self.client.login(email=self.admin.email, password='pw')
+
+    def add_appointments(self, count, start):
+        for i in range(count):
+            doctor = User.objects.create(email=f'doc{start}-{i}@test.com', role='doctor')
+            Appointment.objects.create(patient=self.patient, doctor=doctor, scheduled_time=timezone.now() + timedelta(days=start + i), status=Appointment.STATUS_PENDING)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Related users are joined and the date hierarchy avoids DISTINCT scans"""
+        url = reverse('admin:appointments_appointment_changelist')
+        self.add_appointments(1, 0)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self.add_appointments(5, 10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+        self.assertFalse([q for q in large if 'DISTINCT' in q['sql']])
+        self.assertEqual(response.context['cl'].result_count, 6)
+
+    def test_bounded_date_hierarchy_drilldown(self):
+        """Drilldown choices come from the MIN/MAX bounds"""
+        when = timezone.make_aware(datetime(2030, 3, 10, 9))
+        for offset in (0, 5):
+            doctor = User.objects.create(email=f'doc{offset}@test.com', role='doctor')
+            Appointment.objects.create(patient=self.patient, doctor=doctor, scheduled_time=when + timedelta(days=offset), status=Appointment.STATUS_PENDING)
+        response = self.client.get(reverse('admin:appointments_appointment_changelist'))
+        # Everything falls in one month, so the drilldown starts at its days
+        self.assertContains(response, 'scheduled_time__day=10')
+        self.assertContains(response, 'scheduled_time__day=15')
+        self.assertNotContains(response, 'scheduled_time__day=16')
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_reports_every_scenario(self):
+        """A tiny run reports percentiles and query counts for each hot path"""
+        cache.clear()
+        counts = DatasetBuilder(doctors=3, patients=10, appointments_per_patient=6, future_ratio=0.5, seed=1).build()
+        self.assertEqual(counts['doctors'], 3)
+        self.assertEqual(Appointment.objects.count(), counts['appointments'])
+        out = StringIO()
+        call_command('benchmark_clinic', '--existing', '--iterations', '3', '--warmup', '0', stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['dataset']['records'], counts['records'])
+        self.assertEqual(set(report['scenarios']), {'patient_dashboard', 'doctor_dashboard', 'booking_post', 'action_post', 'record_detail', 'api_appointments'})
+        for name, result in report['scenarios'].items():
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['max'])
+            self.assertGreater(result['queries']['max'], 0)
+        self.assertEqual(report['scenarios']['booking_post']['status_codes'], {'302': 3})
+        self.assertEqual(report['scenarios']['record_detail']['status_codes'], {'200': 3})
+
+class QueryPlanTests(TestCase):
+    def test_dashboard_queries_use_indexes(self):
+        DatasetBuilder(doctors=2, patients=5, appointments_per_patient=4, seed=1).build()
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('answered from indexes', out.getvalue())
+        self.assertNotIn('full scan', out.getvalue())
+
+    def test_full_scan_is_reported(self):
+        # Nothing indexes the free text
+        plan, scans = full_scans(Appointment.objects.filter(reason_for_visit='Checkup'))
+        self.assertEqual(scans, ['appointments_appointment'])
+
+class SeedClinicTests(TestCase):
+    def seeded_rows(self, **options):
+        sid = transaction.savepoint()
+        call_command('seed_clinic', '--doctors', '4', '--patients', '12', '--appointments-per-patient', '5', stdout=StringIO(), **options)
+        rows = list(Appointment.objects.order_by('pk').values_list('pk', 'doctor__email', 'patient__email', 'scheduled_time', 'status'))
+        records = list(MedicalRecord.objects.order_by('pk').values_list('pk', 'notes'))
+        transaction.savepoint_rollback(sid)
+        return rows, records
+
+    def test_same_seed_same_data(self):
+        first = self.seeded_rows(seed=3)
+        self.assertTrue(first[0] and first[1])
+        self.assertEqual(first, self.seeded_rows(seed=3))
+        self.assertNotEqual(first, self.seeded_rows(seed=4))
+
+    def test_seeded_users_share_one_password_hash(self):
+        call_command('seed_clinic', '--doctors', '2', '--patients', '5', '--appointments-per-patient', '2', stdout=StringIO())
+        self.assertEqual(User.objects.values('password').distinct().count(), 1)
+        self.assertTrue(self.client.login(email='patient-0@dataset.clinic.test', password='clinic-dataset'))
+        # Future active appointments never collide on the slot constraint
+        active = Appointment.objects.filter(status__in=Appointment.ACTIVE_STATUSES)
+        self.assertEqual(active.count(), active.values('doctor', 'scheduled_time').distinct().count())
+
+    def test_doctor_skew_concentrates_bookings(self):
+        call_command('seed_clinic', '--doctors', '20', '--patients', '50', '--doctor-skew', '1.5', stdout=StringIO())
+        busiest = Appointment.objects.values('doctor').annotate(n=Count('pk')).order_by('-n')
+        self.assertGreater(busiest[0]['n'], Appointment.objects.count() / 5)
+
+handled = []
+
+
+@outbox.handler('test.ok')
+def record_payload(payload):
+    handled.append(payload['n'])
+
+
+@outbox.handler('test.fail')
+def always_fail(payload):
+    raise RuntimeError('boom')
+
+
+class OutboxWorkerTests(TestCase):
+    def setUp(self):
+        handled.clear()
+
+    def test_worker_processes_due_messages(self):
+        for n in range(5):
+            outbox.enqueue('test.ok', {'n': n})
+        out = StringIO()
+        call_command('run_outbox_worker', '--once', '--threads', '2', '--batch-size', '2', stdout=out)
+        self.assertEqual(sorted(handled), [0, 1, 2, 3, 4])
+        self.assertFalse(OutboxMessage.objects.filter(processed_at__isnull=True).exists())
+        self.assertIn('Processed 5', out.getvalue())
+
+    def test_failures_are_retried_with_backoff(self):
+        failing = outbox.enqueue('test.fail', {})
+        unknown = outbox.enqueue('test.unknown', {})
+        with self.assertLogs('apps.core.outbox', 'ERROR'):
+            self.assertEqual(outbox.process_batch(), 2)
+        failing.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertIsNone(failing.processed_at)
+        self.assertEqual(failing.attempts, 1)
+        self.assertIn('RuntimeError: boom', failing.last_error)
+        self.assertGreater(failing.available_at, timezone.now())
+        self.assertIn('No handler', unknown.last_error)
+        # Not due yet
+        self.assertEqual(outbox.process_batch(), 0)
+
+    def test_exhausted_messages_are_left_alone(self):
+        outbox.enqueue('test.ok', {'n': 1})
+        OutboxMessage.objects.update(attempts=outbox.MAX_ATTEMPTS)
+        self.assertEqual(outbox.process_batch(), 0)
+        self.assertEqual(handled, [])
+
+    def test_processed_messages_are_purged(self):
+        message = outbox.enqueue('test.ok', {'n': 1})
+        OutboxMessage.objects.filter(pk=message.pk).update(processed_at=timezone.now() - timedelta(days=10))
+        self.assertEqual(outbox.purge_processed(timezone.now() - timedelta(days=7)), 1)
+
+class InlineOutboxWorkerTests(TransactionTestCase):
+    # Not wrapped in a test transaction, so the worker commits and closes
+    # connections as it does in production
+    def setUp(self):
+        handled.clear()
+
+    def test_inline_worker_records_outcomes(self):
+        """--threads 1 runs handlers on the thread holding the claim"""
+        for n in range(3):
+            outbox.enqueue('test.ok', {'n': n})
+        failing = outbox.enqueue('test.fail', {})
+        out = StringIO()
+
+        def close_old_connections():
+            # The in-memory test database survives close(), so check the condition
+            # that closes a file or server connection: an open claim transaction
+            self.assertFalse(connection.in_atomic_block, "closed the connection holding the claim")
+
+        with self.assertLogs('apps.core.outbox', 'ERROR'), \
+                mock.patch('apps.core.outbox.close_old_connections', close_old_connections):
+            call_command('run_outbox_worker', '--once', '--threads', '1', stdout=out)
+        self.assertEqual(sorted(handled), [0, 1, 2])
+        self.assertEqual(OutboxMessage.objects.filter(processed_at__isnull=False).count(), 3)
+        failing.refresh_from_db()
+        self.assertEqual(failing.attempts, 1)
@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Async dashboards only pay off under an ASGI server; under WSGI each would need its own event loop
+if settings.ASYNC_DASHBOARDS:
+    patient_dashboard = views.AsyncPatientDashboardView
+    doctor_dashboard = views.AsyncDoctorDashboardView
+else:
+    patient_dashboard = views.PatientDashboardView
+    doctor_dashboard = views.DoctorDashboardView
+
 urlpatterns = [
     path('', views.home, name='home'),
-    path('patient-dashboard/', views.PatientDashboardView.as_view(), name='patient_dashboard'),
-    path('doctor-dashboard/', views.DoctorDashboardView.as_view(), name='doctor_dashboard'),
+    path('patient-dashboard/', patient_dashboard.as_view(), name='patient_dashboard'),
+    path('doctor-dashboard/', doctor_dashboard.as_view(), name='doctor_dashboard'),
 ]
@@ -1,60 +1,163 @@
 from django.shortcuts import render
-from django.views.generic import TemplateView
+from django.urls import reverse
 from django.utils import timezone
-from .mixins import PatientRequiredMixin, DoctorRequiredMixin, AdminRequiredMixin
-from apps.appointments.models import Appointment
+from django.views.generic import TemplateView
+from .conditional import ConditionalGetMixin, change_stamp, counterpart_versions, page_etag
+from .fragments import CachedRows
+from .mixins import (
+    PatientRequiredMixin, DoctorRequiredMixin, AdminRequiredMixin,
+    ContextQueriesMixin, AsyncContextQueriesMixin,
+)
+from apps.appointments.archive import history_page
+from apps.appointments.ical import calendar_token
+from apps.appointments.models import Appointment, ArchivedAppointment
+from apps.appointments.services import (
+    agenda_appointments, get_doctor_agenda, doctor_completed_appointments, AGENDA_COMPLETED_LIMIT
+)
+from .pagination import paginate_keyset, cursor_url, seek
+
+# Rows per "load more" page of the history lists
+HISTORY_PAGE_SIZE = 20
 
 def home(request):
     return render(request, 'core/home.html')
 
-class PatientDashboardView(PatientRequiredMixin, TemplateView):
+# What each cached dashboard row shows, besides what updated_at already covers
+def patient_row_key(appt):
+    return appt.pk, appt.updated_at, appt.doctor.last_name
+
+def record_row_key(record):
+    return record.pk, record.doctor.last_name
+
+def doctor_row_key(appt):
+    record_id = appt.medical_record.pk if hasattr(appt, 'medical_record') else None
+    return appt.pk, appt.updated_at, appt.patient.first_name, appt.patient.last_name, record_id, appt.is_archived
+
+# The patient dashboard's querysets, also checked by check_query_plans
+def patient_appointments(user, model=Appointment):
+    # Join the doctor up front and load only the columns the template renders,
+    # otherwise every row costs an extra query for appt.doctor
+    return model.objects.filter(patient=user).select_related('doctor').only(
+        'scheduled_time', 'status', 'updated_at', 'doctor__last_name'
+    )
+
+def patient_upcoming(user):
+    return patient_appointments(user).filter(status__in=Appointment.ACTIVE_STATUSES).order_by('scheduled_time')
+
+def patient_history(user, model=Appointment):
+    # Everything in the archive is finished
+    if model is ArchivedAppointment:
+        return patient_appointments(user, model)
+    return patient_appointments(user).filter(status__in=Appointment.FINISHED_STATUSES)
+
+def patient_records(user):
+    # patient is kept so the related manager can attach `user` without a lookup
+    return user.medical_records.select_related('doctor').only('created_at', 'patient', 'doctor__last_name')
+
+def completed_page_patients(user, cursor, model=Appointment):
+    # A superset of the patients on that completed page: archived rows may be merged in
+    page = seek(doctor_completed_appointments(user, model), 'scheduled_time', cursor).values('pk')
+    return model.objects.filter(pk__in=page[:AGENDA_COMPLETED_LIMIT + 1]).values_list('patient_id', flat=True)
+
+class PatientDashboardView(PatientRequiredMixin, ConditionalGetMixin, ContextQueriesMixin, TemplateView):
     template_name = 'dashboards/patient.html'
-    
+    read_from_replica = True
+
+    def get_validators(self):
+        user = self.request.user
+        stamp = change_stamp(
+            appointments=(user.patient_appointments.all(), 'updated_at'),
+            records=(user.medical_records.all(), 'created_at'),
+        )
+        # Rows show their doctor's name, which can change without touching the rows
+        doctors = counterpart_versions(
+            user.patient_appointments.values_list('doctor_id', flat=True),
+            ArchivedAppointment.objects.filter(patient=user).values_list('doctor_id', flat=True),
+            user.medical_records.values_list('doctor_id', flat=True),
+        )
+        return page_etag(self.request, *stamp, *doctors), None
+
+    def get_context_queries(self):
+        user = self.request.user
+        # History lists grow forever, so they are keyset paginated; old ones are archived
+        return {
+            'upcoming_appointments': lambda: list(patient_upcoming(user)),
+            'past_appointments': lambda: history_page(
+                patient_history(user), patient_history(user, ArchivedAppointment),
+                self.request.GET.get('past_cursor'), HISTORY_PAGE_SIZE
+            ),
+            'medical_records': lambda: paginate_keyset(
+                patient_records(user), 'created_at', self.request.GET.get('records_cursor'), HISTORY_PAGE_SIZE
+            ),
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Fetch data for dashboard
-        user = self.request.user
-        context['upcoming_appointments'] = Appointment.objects.filter(
-            patient=user, 
-            status__in=[Appointment.STATUS_PENDING, Appointment.STATUS_CONFIRMED]
-        ).order_by('scheduled_time')
-        context['past_appointments'] = Appointment.objects.filter(
-            patient=user,
-            status__in=[Appointment.STATUS_COMPLETED, Appointment.STATUS_CANCELLED]
-        ).order_by('-scheduled_time')
-        context['medical_records'] = user.medical_records.all().order_by('-created_at')
+        context['past_more_url'] = cursor_url(self.request, 'past_cursor', context['past_appointments'].next_cursor)
+        context['records_more_url'] = cursor_url(self.request, 'records_cursor', context['medical_records'].next_cursor)
+        context['upcoming_rows'] = CachedRows('dashboards/rows/patient_upcoming.html', context['upcoming_appointments'], patient_row_key, 'appt')
+        context['past_rows'] = CachedRows('dashboards/rows/patient_past.html', context['past_appointments'], patient_row_key, 'appt')
+        context['record_rows'] = CachedRows('dashboards/rows/patient_record.html', context['medical_records'], record_row_key, 'record')
         return context
 
-class DoctorDashboardView(DoctorRequiredMixin, TemplateView):
+class DoctorDashboardView(DoctorRequiredMixin, ConditionalGetMixin, ContextQueriesMixin, TemplateView):
     template_name = 'dashboards/doctor.html'
+    read_from_replica = True
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    def get_validators(self):
         user = self.request.user
         now = timezone.now()
+        stamp = change_stamp(
+            appointments=(user.doctor_appointments.all(), 'updated_at'),
+            records=(user.authored_records.all(), 'created_at'),
+            # Pending requests leave the page once their time has passed, without
+            # any row changing; the count of those still ahead drops when one does
+            pending=(user.doctor_appointments.filter(
+                status=Appointment.STATUS_PENDING, scheduled_time__gte=now
+            ), 'scheduled_time'),
+        )
+        # Rows show their patient's name, which can change without touching the rows
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-        # Base queryset
-        qs = Appointment.objects.filter(doctor=user)
+        cursor = self.request.GET.get('completed_cursor')
+        patients = counterpart_versions(
+            agenda_appointments(user, today_start).values_list('patient_id', flat=True),
+            completed_page_patients(user, cursor),
+            completed_page_patients(user, cursor, ArchivedAppointment),
+        )
+        # The today/upcoming split moves at midnight even when no row changes
+        return page_etag(self.request, timezone.localdate(), *stamp, *patients), None
 
-        context['todays_appointments'] = qs.filter(
-            scheduled_time__range=(today_start, today_end),
-            status=Appointment.STATUS_CONFIRMED
-        ).order_by('scheduled_time')
-
-        context['upcoming_appointments'] = qs.filter(
-            scheduled_time__gt=today_end,
-            status=Appointment.STATUS_CONFIRMED
-        ).order_by('scheduled_time')
+    def get_context_queries(self):
+        user = self.request.user
+        # One scan of the doctor's open appointments from today on, split into buckets in Python.
+        # Completed visits are paged from their own index, however long ago the last one was.
+        return {
+            'agenda': lambda: get_doctor_agenda(user),
+            'completed_appointments': lambda: history_page(
+                doctor_completed_appointments(user),
+                doctor_completed_appointments(user, ArchivedAppointment),
+                self.request.GET.get('completed_cursor'), AGENDA_COMPLETED_LIMIT
+            ),
+        }
 
-        context['pending_appointments'] = qs.filter(
-            status=Appointment.STATUS_PENDING,
-            scheduled_time__gte=now
-        ).order_by('scheduled_time')
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        agenda = context.pop('agenda')
+        context['todays_appointments'] = agenda.today
+        context['upcoming_appointments'] = agenda.upcoming
+        context['pending_appointments'] = agenda.pending
+        completed = context['completed_appointments']
+        context['completed_more_url'] = cursor_url(self.request, 'completed_cursor', completed.next_cursor)
+        context['todays_rows'] = CachedRows('dashboards/rows/doctor_today.html', agenda.today, doctor_row_key, 'appt')
+        context['pending_rows'] = CachedRows('dashboards/rows/doctor_pending.html', agenda.pending, doctor_row_key, 'appt')
+        context['completed_rows'] = CachedRows('dashboards/rows/doctor_completed.html', completed, doctor_row_key, 'appt')
+        context['calendar_feed_url'] = self.request.build_absolute_uri(
+            reverse('doctor_calendar_feed', args=[calendar_token(self.request.user)])
+        )
+        return context
 
-        context['completed_appointments'] = qs.filter(
-            status=Appointment.STATUS_COMPLETED
-        ).order_by('-scheduled_time')[:10] # Limit to recent 10
+class AsyncPatientDashboardView(AsyncContextQueriesMixin, PatientDashboardView):
+    """Patient dashboard for ASGI: upcoming, past and records load concurrently."""
 
-        return context
+class AsyncDoctorDashboardView(AsyncContextQueriesMixin, DoctorDashboardView):
+    """Doctor dashboard for ASGI: the agenda and the completed page load concurrently."""
@@ -1,16 +1,27 @@
 from django.contrib import admin
+from apps.core.admin import LargeTableAdminMixin
 from .models import MedicalRecord
+from .search import search_records
 
 @admin.register(MedicalRecord)
-class MedicalRecordAdmin(admin.ModelAdmin):
+class MedicalRecordAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('created_at', 'patient', 'doctor', 'get_status_display')
-    search_fields = ('patient__email', 'patient__last_name', 'doctor__last_name', 'diagnosis')
+    list_select_related = ('patient', 'doctor')
+    # Emails match exactly and last names by prefix; free text is matched by the
+    # full-text index in get_search_results(), not icontains
+    search_fields = ('=patient__email', '=doctor__email', '^patient__last_name', '^doctor__last_name')
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     
     # Read-only fields to enforce immutability context in Admin
     # Though admins *can* usually do anything, it's good practice to mark critical audit info as read-only
-    readonly_fields = ('created_at', 'patient', 'doctor', 'appointment')
+    readonly_fields = ('created_at', 'patient', 'doctor', 'appointment', 'archived_appointment')
+
+    def get_search_results(self, request, queryset, search_term):
+        by_email, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term:
+            return by_email, may_have_duplicates
+        return by_email | search_records(queryset, search_term), may_have_duplicates
 
     def get_status_display(self, obj):
         return "Finalized" # Records are created only when finalized/completed
@@ -0,0 +1,76 @@
+# Full-text search over MedicalRecord diagnosis and notes.
+#
+# PostgreSQL: a generated tsvector column with a GIN index, maintained by the
+# database on insert. SQLite (local/dev): an external-content FTS5 table kept in
+# sync by triggers. Other backends fall back to icontains in records.search.
+
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE records_medicalrecord ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('english', coalesce(diagnosis, '') || ' ' || coalesce(notes, ''))
+    ) STORED
+    """,
+    "CREATE INDEX records_medicalrecord_search_idx ON records_medicalrecord USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS records_medicalrecord_search_idx",
+    "ALTER TABLE records_medicalrecord DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE records_medicalrecord_fts USING fts5(
+        diagnosis, notes, content='records_medicalrecord', content_rowid='rowid'
+    )
+    """,
+    """
+    INSERT INTO records_medicalrecord_fts(rowid, diagnosis, notes)
+    SELECT rowid, diagnosis, notes FROM records_medicalrecord
+    """,
+    # Records are immutable, so only inserts and deletes need to be mirrored
+    """
+    CREATE TRIGGER records_medicalrecord_fts_insert AFTER INSERT ON records_medicalrecord BEGIN
+        INSERT INTO records_medicalrecord_fts(rowid, diagnosis, notes)
+        VALUES (new.rowid, new.diagnosis, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER records_medicalrecord_fts_delete AFTER DELETE ON records_medicalrecord BEGIN
+        INSERT INTO records_medicalrecord_fts(records_medicalrecord_fts, rowid, diagnosis, notes)
+        VALUES ('delete', old.rowid, old.diagnosis, old.notes);
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS records_medicalrecord_fts_insert",
+    "DROP TRIGGER IF EXISTS records_medicalrecord_fts_delete",
+    "DROP TABLE IF EXISTS records_medicalrecord_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
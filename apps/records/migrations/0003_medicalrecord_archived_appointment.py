@@ -0,0 +1,62 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# On SQLite, altering records_medicalrecord rebuilds the table: its FTS triggers
+# are dropped with the old table and rowids may be renumbered, so the triggers
+# from 0002 are recreated and the FTS index rebuilt from the new table.
+SQLITE_RESTORE_SEARCH = [
+    "DROP TRIGGER IF EXISTS records_medicalrecord_fts_insert",
+    "DROP TRIGGER IF EXISTS records_medicalrecord_fts_delete",
+    """
+    CREATE TRIGGER records_medicalrecord_fts_insert AFTER INSERT ON records_medicalrecord BEGIN
+        INSERT INTO records_medicalrecord_fts(rowid, diagnosis, notes)
+        VALUES (new.rowid, new.diagnosis, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER records_medicalrecord_fts_delete AFTER DELETE ON records_medicalrecord BEGIN
+        INSERT INTO records_medicalrecord_fts(records_medicalrecord_fts, rowid, diagnosis, notes)
+        VALUES ('delete', old.rowid, old.diagnosis, old.notes);
+    END
+    """,
+    "INSERT INTO records_medicalrecord_fts(records_medicalrecord_fts) VALUES ('rebuild')",
+]
+
+
+def restore_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_RESTORE_SEARCH:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_archivedappointment'),
+        ('records', '0002_medicalrecord_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Undone last when migrating backwards, after the rebuilds below
+        migrations.RunPython(migrations.RunPython.noop, restore_search),
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='archived_appointment',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='medical_record', to='appointments.archivedappointment'),
+        ),
+        migrations.AlterField(
+            model_name='medicalrecord',
+            name='appointment',
+            field=models.OneToOneField(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='medical_record', to='appointments.appointment'),
+        ),
+        migrations.AddConstraint(
+            model_name='medicalrecord',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('appointment__isnull', False), ('archived_appointment__isnull', True)), models.Q(('appointment__isnull', True), ('archived_appointment__isnull', False)), _connector='OR'), name='record_has_one_appointment'),
+        ),
+        migrations.RunPython(restore_search, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+from apps.core.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('records', '0003_medicalrecord_archived_appointment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', 'created_at'], name='records_med_patient_453fcf_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicalrecord',
+            index=models.Index(fields=['doctor', 'created_at'], name='records_med_doctor__5c6db3_idx'),
+        ),
+    ]
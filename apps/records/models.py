@@ -1,9 +1,25 @@
 import uuid
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.core.exceptions import ValidationError, PermissionDenied
 from django.utils.translation import gettext_lazy as _
-from apps.appointments.models import Appointment
+from apps.appointments.models import Appointment, ArchivedAppointment
+
+# The id of the appointment a record belongs to, live or archived, for values_list()
+APPOINTMENT_ID = Coalesce('appointment_id', 'archived_appointment_id')
+
+class MedicalRecordQuerySet(models.QuerySet):
+    def viewable_by(self, user):
+        """The records `user` may see: MedicalRecord.is_viewable_by() as a filter."""
+        if user.role == 'admin':
+            return self.all()
+        if user.role == 'patient':
+            return self.filter(patient=user)
+        if user.role == 'doctor':
+            return self.filter(doctor=user)
+        return self.filter(Q(patient=user) | Q(doctor=user))
 
 class MedicalRecord(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -21,9 +37,20 @@ class MedicalRecord(models.Model):
         related_name='authored_records',
         editable=False
     )
+    # Exactly one of these is set: archive_appointments moves the link to the
+    # archived copy (same id) when it moves the appointment
     appointment = models.OneToOneField(
         Appointment,
         on_delete=models.PROTECT,
+        null=True,
+        related_name='medical_record',
+        editable=False
+    )
+    archived_appointment = models.OneToOneField(
+        ArchivedAppointment,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
         related_name='medical_record',
         editable=False
     )
@@ -35,19 +62,33 @@ class MedicalRecord(models.Model):
     # Audit
     created_at = models.DateTimeField(auto_now_add=True)
     # No updated_at - records are immutable
+
+    objects = MedicalRecordQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A patient's records newest first, a doctor's for search, and both ETags
+            models.Index(fields=['patient', 'created_at']),
+            models.Index(fields=['doctor', 'created_at']),
+        ]
         permissions = [
             ("view_own_record", "Can view own medical record"),
         ]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(appointment__isnull=False, archived_appointment__isnull=True)
+                | Q(appointment__isnull=True, archived_appointment__isnull=False),
+                name='record_has_one_appointment',
+            ),
+        ]
 
     def __str__(self):
         return f"Record for {self.patient} by {self.doctor} on {self.created_at.date()}"
 
     def clean(self):
         # 1. Integrity Check against Appointment
-        if not hasattr(self, 'appointment'):
+        if getattr(self, 'appointment', None) is None:
             return
 
         # Ensure Appointment is COMPLETED
@@ -87,7 +128,7 @@ class MedicalRecord(models.Model):
         raise PermissionDenied(_("Medical records cannot be deleted."))
 
     def is_viewable_by(self, user):
-        if user == self.doctor or user == self.patient:
+        if user.pk in (self.doctor_id, self.patient_id):
             return True
         if user.role == 'admin':
             return True
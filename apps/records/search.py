@@ -0,0 +1,40 @@
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+
+def _fts5_query(terms):
+    # Quote every term so user input can't use FTS5 query syntax
+    return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+
+def search_records(queryset, query):
+    """
+    Filter a MedicalRecord queryset to rows whose diagnosis or notes match `query`.
+
+    Uses the indexed tsvector column on PostgreSQL and the FTS5 table on SQLite
+    (see migration 0002_medicalrecord_search); other backends fall back to a scan.
+    """
+    terms = query.split()
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        match = RawSQL(
+            "\"records_medicalrecord\".\"search_vector\" @@ websearch_to_tsquery('english', %s)",
+            [query], output_field=BooleanField()
+        )
+        return queryset.filter(match)
+    if vendor == 'sqlite':
+        match = RawSQL(
+            "\"records_medicalrecord\".\"rowid\" IN ("
+            "SELECT rowid FROM records_medicalrecord_fts WHERE records_medicalrecord_fts MATCH %s)",
+            [_fts5_query(terms)], output_field=BooleanField()
+        )
+        return queryset.filter(match)
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(diagnosis__icontains=term) | Q(notes__icontains=term)
+    return queryset.filter(condition)
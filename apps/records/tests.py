@@ -1,9 +1,17 @@
+import csv
+import io
+import json
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from apps.appointments.models import Appointment
+from apps.core.exports import keyset_chunks
 from .models import MedicalRecord
+from .search import search_records
 
 User = get_user_model()
 
@@ -68,6 +76,26 @@ class MedicalRecordTests(TestCase):
         response = self.client.get(reverse('record_detail', args=[record.pk]))
         self.assertEqual(response.status_code, 403)
 
+    def test_record_detail_not_modified(self):
+        """An unchanged record answers 304 from one query, but never to a stranger"""
+        cache.clear()
+        record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, appointment=self.appt, diagnosis="Flu", notes="Rest")
+        url = reverse('record_detail', args=[record.pk])
+        self.client.login(email=self.patient.email, password='pw')
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertFalse(not_modified.templates)
+
+        other_patient = User.objects.create_user(email='intruder@test.com', password='pw', role='patient')
+        self.client.login(email=other_patient.email, password='pw')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 403)
+
     def test_create_record_incomplete_appointment(self):
         """Test validation error if appointment is not completed"""
         pending_appt = Appointment.objects.create(
@@ -100,3 +128,97 @@ class MedicalRecordTests(TestCase):
              response = self.client.post(url, {'diagnosis': 'X', 'notes': 'Y'})
              # Should fail
              self.assertNotEqual(response.status_code, 302) # Should not success redirect
+
+class MedicalRecordExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.patient = User.objects.create_user(email='p@test.com', password='pw', role='patient', first_name='P', last_name='T')
+        self.other_patient = User.objects.create_user(email='p2@test.com', password='pw', role='patient')
+        self.doctor = User.objects.create_user(email='d@test.com', password='pw', role='doctor', first_name='D', last_name='T')
+        for patient, diagnosis in ((self.patient, 'Flu'), (self.other_patient, 'Cold')):
+            appt = Appointment.objects.create(patient=patient, doctor=self.doctor, scheduled_time=timezone.now(), status=Appointment.STATUS_COMPLETED)
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, appointment=appt, diagnosis=diagnosis, notes='Rest')
+
+    def test_patient_csv_export(self):
+        """Patients stream only their own records"""
+        self.client.login(email=self.patient.email, password='pw')
+        response = self.client.get(reverse('patient_record_export', args=['csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['diagnosis'] for row in rows], ['Flu'])
+        self.assertEqual(rows[0]['doctor_email'], 'd@test.com')
+
+    def test_admin_ndjson_export(self):
+        """Admins stream every record; others are refused"""
+        self.client.login(email=self.patient.email, password='pw')
+        self.assertEqual(self.client.get(reverse('admin_record_export', args=['ndjson'])).status_code, 403)
+
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='pw', role='admin')
+        self.client.login(email=admin_user.email, password='pw')
+        response = self.client.get(reverse('admin_record_export', args=['ndjson']))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['diagnosis'] for line in lines), ['Cold', 'Flu'])
+        self.assertEqual(self.client.get(reverse('admin_record_export', args=['xml'])).status_code, 404)
+
+    def test_export_without_server_side_cursors(self):
+        """Behind PgBouncer, exports page through rows in keyset chunks"""
+        # Equal sort values must neither repeat nor drop rows across chunks
+        same_time = timezone.now()
+        for _ in range(3):
+            Appointment.objects.create(patient=self.other_patient, doctor=self.doctor, scheduled_time=same_time, status=Appointment.STATUS_CANCELLED)
+        appointments = Appointment.objects.order_by('scheduled_time')
+        self.assertEqual(
+            list(keyset_chunks(appointments, ['id', 'status'], chunk_size=2)),
+            list(appointments.order_by('scheduled_time', 'pk').values_list('id', 'status')),
+        )
+
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='pw', role='admin')
+        self.client.login(email=admin_user.email, password='pw')
+        with mock.patch.dict(connection.settings_dict, DISABLE_SERVER_SIDE_CURSORS=True), \
+                mock.patch('apps.core.exports.keyset_chunks', wraps=keyset_chunks) as chunks:
+            response = self.client.get(reverse('admin_record_export', args=['csv']))
+            rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        chunks.assert_called_once()
+        self.assertEqual(sorted(row['diagnosis'] for row in rows), ['Cold', 'Flu'])
+
+class MedicalRecordSearchTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.patient = User.objects.create_user(email='p@test.com', password='pw', role='patient', first_name='P', last_name='T')
+        self.doctor = User.objects.create_user(email='d@test.com', password='pw', role='doctor', first_name='D', last_name='T')
+        self.other_doctor = User.objects.create_user(email='d2@test.com', password='pw', role='doctor', last_name='House')
+        self.flu = self.add_record(self.doctor, 'Seasonal influenza', 'Rest and fluids')
+        self.sprain = self.add_record(self.doctor, 'Ankle sprain', 'Ice, compression; review influenza vaccine')
+        self.other = self.add_record(self.other_doctor, 'Influenza', 'Someone else')
+
+    def add_record(self, doctor, diagnosis, notes):
+        appt = Appointment.objects.create(patient=self.patient, doctor=doctor, scheduled_time=timezone.now(), status=Appointment.STATUS_COMPLETED)
+        return MedicalRecord.objects.create(patient=self.patient, doctor=doctor, appointment=appt, diagnosis=diagnosis, notes=notes)
+
+    def test_search_matches_diagnosis_and_notes(self):
+        """The full-text index covers both columns"""
+        results = search_records(MedicalRecord.objects.all(), 'influenza')
+        self.assertEqual(set(results), {self.flu, self.sprain, self.other})
+        results = search_records(MedicalRecord.objects.all(), 'ankle "sprain')
+        self.assertEqual(list(results), [self.sprain])
+        self.assertFalse(search_records(MedicalRecord.objects.all(), 'diabetes').exists())
+
+    def test_doctor_search_view_is_scoped(self):
+        """Doctors only find records they wrote"""
+        self.client.login(email=self.doctor.email, password='pw')
+        response = self.client.get(reverse('record_search'), {'q': 'influenza'})
+        self.assertEqual(set(response.context['records']), {self.flu, self.sprain})
+
+    def test_admin_search_uses_full_text(self):
+        """Admin changelist search finds records by diagnosis"""
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='pw', role='admin')
+        self.client.login(email=admin_user.email, password='pw')
+        response = self.client.get(reverse('admin:records_medicalrecord_changelist'), {'q': 'sprain'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.sprain])
+        response = self.client.get(reverse('admin:records_medicalrecord_changelist'), {'q': 'p@test.com'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        # Patient and doctor names still match by prefix
+        response = self.client.get(reverse('admin:records_medicalrecord_changelist'), {'q': 'hou'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.other])
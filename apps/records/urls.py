@@ -3,5 +3,8 @@ from . import views
 
 urlpatterns = [
     path('create/<uuid:appointment_id>/', views.CreateMedicalRecordView.as_view(), name='create_medical_record'),
+    path('search/', views.DoctorRecordSearchView.as_view(), name='record_search'),
+    path('export/all/<str:fmt>/', views.AdminRecordExportView.as_view(), name='admin_record_export'),
+    path('export/<str:fmt>/', views.PatientRecordExportView.as_view(), name='patient_record_export'),
     path('<uuid:pk>/', views.MedicalRecordDetailView.as_view(), name='record_detail'),
 ]
@@ -1,11 +1,16 @@
-from django.views.generic import CreateView
+from django.views.generic import CreateView, TemplateView
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
-from django.core.exceptions import PermissionDenied, ValidationError
-from apps.core.mixins import DoctorRequiredMixin
+from django.core.exceptions import PermissionDenied
+from apps.accounts.backends import user_version
+from apps.core.conditional import ConditionalGetMixin, page_etag
+from apps.core.exports import StreamingExportView
+from apps.core.pagination import paginate_keyset, cursor_url
+from apps.core.mixins import DoctorRequiredMixin, PatientRequiredMixin, AdminRequiredMixin
 from apps.appointments.models import Appointment
-from .models import MedicalRecord
+from .models import APPOINTMENT_ID, MedicalRecord
 from .forms import MedicalRecordForm
+from .search import search_records
 
 class CreateMedicalRecordView(DoctorRequiredMixin, CreateView):
     model = MedicalRecord
@@ -45,13 +50,76 @@ class CreateMedicalRecordView(DoctorRequiredMixin, CreateView):
 
 from django.views.generic import DetailView
 
-class MedicalRecordDetailView(DetailView):
+class MedicalRecordDetailView(ConditionalGetMixin, DetailView):
     model = MedicalRecord
     template_name = 'records/detail.html'
     context_object_name = 'record'
+    read_from_replica = True
+
+    def get_validators(self):
+        # Records never change, so the id and created_at are enough. Access is
+        # part of the query, so a 304 is never sent to someone who'd get a 403.
+        user = self.request.user
+        if not user.is_authenticated:
+            return None, None
+        row = MedicalRecord.objects.viewable_by(user).filter(pk=self.kwargs['pk']).values_list('doctor_id', 'created_at').first()
+        if row is None:
+            return None, None
+        doctor_id, created_at = row
+        # The page shows the doctor's name, which can change
+        return page_etag(self.request, created_at.timestamp(), user_version(doctor_id)), created_at
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
         if not obj.is_viewable_by(self.request.user):
             raise PermissionDenied("You do not have permission to view this record.")
         return obj
+
+
+class DoctorRecordSearchView(DoctorRequiredMixin, TemplateView):
+    """Full-text search over the records the doctor has written."""
+    template_name = 'records/search.html'
+    page_size = 20
+    read_from_replica = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        if query:
+            records = search_records(
+                MedicalRecord.objects.filter(doctor=self.request.user), query
+            ).select_related('patient').only('created_at', 'diagnosis', 'patient__first_name', 'patient__last_name')
+            page = paginate_keyset(records, 'created_at', self.request.GET.get('cursor'), self.page_size)
+            context['records'] = page
+            context['more_url'] = cursor_url(self.request, 'cursor', page.next_cursor)
+        return context
+
+
+RECORD_EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('appointment_id', APPOINTMENT_ID),
+    ('patient_email', 'patient__email'),
+    ('patient_first_name', 'patient__first_name'),
+    ('patient_last_name', 'patient__last_name'),
+    ('doctor_email', 'doctor__email'),
+    ('doctor_last_name', 'doctor__last_name'),
+    ('diagnosis', 'diagnosis'),
+    ('notes', 'notes'),
+)
+
+class PatientRecordExportView(PatientRequiredMixin, StreamingExportView):
+    columns = RECORD_EXPORT_COLUMNS
+    filename = 'medical-records'
+
+    def get_queryset(self):
+        return MedicalRecord.objects.filter(patient=self.request.user).order_by('created_at')
+
+class AdminRecordExportView(AdminRequiredMixin, StreamingExportView):
+    columns = RECORD_EXPORT_COLUMNS
+    filename = 'all-medical-records'
+
+    def get_queryset(self):
+        # Primary key order streams straight off the index without a sort
+        return MedicalRecord.objects.order_by('pk')
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Workers import this module after forking, so their DB_POOL pools open here
+from apps.core.pools import open_connection_pools  # noqa: E402
+
+open_connection_pools()
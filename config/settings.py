@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'apps.appointments',
     'apps.records',
     'apps.core',
+    'apps.api',
 ]
 
 import dj_database_url
@@ -53,14 +54,23 @@ import dj_database_url
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # Add Whitenoise
+    'apps.core.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Sessions are read from the cache and written through to the database, and the
+# logged-in user is resolved from a cached snapshot, so authenticated requests
+# don't need a query before the view runs.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = ['apps.accounts.backends.CachedModelBackend']
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -86,14 +96,73 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Connections (each applies to the primary and the replicas):
+# - DB_POOL=1: a psycopg 3 connection pool per worker process, opened when the
+#   worker starts (see config/wsgi.py), so requests don't wait for connects.
+#   Dead connections are replaced by the pool, which backs off while the
+#   database is away instead of every worker reconnecting at once.
+# - DB_PGBOUNCER=1: behind PgBouncer in transaction pooling mode. Server-side
+#   cursors and prepared statements don't survive a transaction there, so both
+#   are turned off; exports then page through rows in keyset chunks.
+# - Otherwise connections persist for DB_CONN_MAX_AGE seconds.
+# Health checks make sure a reused connection still works before a request uses it.
+DB_POOL = os.getenv('DB_POOL', '0') == '1'
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', '0') == '1'
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True)
+    if config['ENGINE'] != 'django.db.backends.postgresql':
+        return config
+    options = config.setdefault('OPTIONS', {})
+    if DB_POOL:
+        # Pooled connections are returned after each request rather than kept
+        config['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        }
+    if DB_PGBOUNCER:
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+        options['prepare_threshold'] = None
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=os.getenv(
-            'DATABASE_URL', 
-            f"postgres://{os.getenv('DB_USER', 'user')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'db')}"
-        ),
-        conn_max_age=600
-    )
+    'default': database_config(os.getenv(
+        'DATABASE_URL',
+        f"postgres://{os.getenv('DB_USER', 'user')}:{os.getenv('DB_PASSWORD', 'password')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'db')}"
+    ))
+}
+
+# Read replicas: comma-separated DATABASE_URL-style URLs, e.g.
+# REPLICA_DATABASE_URLS=postgres://reader@replica-1/db,postgres://reader@replica-2/db
+# Views with read_from_replica = True read from a random one (apps.core.replicas),
+# except for REPLICA_PIN_SECONDS after the same browser wrote something.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('REPLICA_DATABASE_URLS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = database_config(url.strip())
+    # Tests see the replicas as the primary's test database
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['apps.core.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '15'))
+
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached in production so every worker shares the same entries. User
+# snapshots rely on it, so `check --deploy` refuses local memory outside DEBUG.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'clinic'),
+    }
 }
 
 # Static files (CSS, JavaScript, Images)
@@ -144,3 +213,41 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Async serving: ASGI=1 runs the docker entrypoint under gunicorn with uvicorn
+# workers, and by default switches the dashboards to their async views, which
+# run independent queries concurrently.
+ASYNC_DASHBOARDS = os.getenv('ASYNC_DASHBOARDS', os.getenv('ASGI', '0')) == '1'
+
+# Part of every page ETag (apps.core.conditional). Set it per deploy, e.g. to
+# the commit, so browsers don't get 304s for pages rendered by old templates.
+PAGE_ETAG_SALT = os.getenv('RELEASE', '')
+
+# Request metrics (apps.core.middleware)
+# Server-Timing exposes DB/template timings to the browser, so it's off unless asked for.
+SERVER_TIMING = os.getenv('SERVER_TIMING', '1' if DEBUG else '0') == '1'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # One line per request; only slow requests by default outside DEBUG
+        'apps.core.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO' if DEBUG else 'WARNING'),
+            'propagate': False,
+        },
+        # Outbox handler failures and the audit trail written by outbox handlers
+        'apps.core.outbox': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'apps.audit': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Appointment slot grid used by the availability engine
+CLINIC_SLOT_MINUTES = int(os.getenv('CLINIC_SLOT_MINUTES', '30'))
+CLINIC_OPENING_HOUR = int(os.getenv('CLINIC_OPENING_HOUR', '9'))
+CLINIC_CLOSING_HOUR = int(os.getenv('CLINIC_CLOSING_HOUR', '17'))
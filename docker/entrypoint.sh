@@ -6,6 +6,9 @@ while ! nc -z $DB_HOST $DB_PORT; do
 done
 echo "Postgres started"
 
+# Refuse settings that only work in one process, e.g. a local memory cache
+python manage.py check --deploy --fail-level ERROR || exit 1
+
 # Apply migrations
 python manage.py migrate
 
@@ -13,5 +16,11 @@ python manage.py migrate
 python manage.py collectstatic --noinput
 
 # Start server
+if [ "$ASGI" = "1" ]; then
+  # Async mode: uvicorn workers under gunicorn, see "Async serving" in the README
+  echo "Starting Gunicorn (ASGI, uvicorn workers)..."
+  exec gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker \
+    --bind 0.0.0.0:8000 --workers "${WEB_CONCURRENCY:-2}"
+fi
 echo "Starting Gunicorn..."
 exec gunicorn config.wsgi:application --bind 0.0.0.0:8000